@@ -11,47 +11,77 @@ import uasyncio
 import config
 from utils import scroll_msg
 
+# Cache item names for a bus route's arrivals and a tube line's status
+def bus_item_name(route):
+    return f"next_buses_{route}"
+
+def line_item_name(line_id):
+    return f"line_status_{line_id}"
+
+# One request for the arrivals of all the routes at a stop, with the TFL API's comma separated line ids
+def arrivals_url(routes, stop_id):
+    return f"{config.TFL_API_URL}/Line/{','.join(routes)}/Arrivals/{stop_id}"
+
+# One request for the status of all the lines
+def line_status_url(line_ids):
+    return f"{config.TFL_API_URL}/Line/{','.join(line_ids)}/Status"
+
+def format_next_buses(arrival_times, now):
+    # Minutes until each bus from its arrival time, dropping buses that have gone. None if none are left.
+    minutes = [(arrival_time - now) // 60 for arrival_time in arrival_times if arrival_time >= now]
+    if not minutes:
+        return None
+
+    # Replace 0 with "due"
+    return ", ".join(["due" if time == 0 else str(time) for time in minutes])
+
+# Display text for a route's arrivals, e.g. "Next 141: due, 7 mins", and the time the minutes next change.
+# (None, None) if all the buses have gone.
+def next_buses_text(route, arrival_times, now):
+    bus_info_str = format_next_buses(arrival_times, now)
+    if bus_info_str is None:
+        return None, None
+
+    # A bus's minutes tick down one second past each whole minute before it arrives
+    valid_until = min(now + (arrival_time - now) % 60 + 1 for arrival_time in arrival_times if arrival_time >= now)
+    return f"Next {route}: {bus_info_str} mins", valid_until
+
+def line_status_text(line_id, line_status):
+    return f"{line_id.capitalize()} line: {line_status}"
+
+# Cache items shown together by each display, in order
+BUS_ITEMS = tuple(bus_item_name(route) for route in config.TFL_BUS_ROUTES)
+LINE_ITEMS = tuple(line_item_name(line_id) for line_id in config.TFL_TUBE_LINES)
+
 async def scroll_next_bus_info():
     # print("scroll_next_bus_info() called")
     
-    # Get next buses from cache, if available
+    # Get the next buses text the cache has prepared, if available
     try:
-        # Retrieve the next_buses data from the cache
-        next_buses_data = config.my_cache.get("next_buses")
-
-        # Check if the next_buses data is None (i.e. expired)
-        if next_buses_data is None:
-            raise Exception("Error: next_buses data is expired or missing")
-        else:
-            if not next_buses_data:
-                raise Exception(f"No arrivals found for given bus stop")
-            else:
-                # Replace 0 with "due"
-                bus_info_str = ["due" if time == 0 else str(time) for time in next_buses_data]
-                bus_info_str = ", ".join(bus_info_str)
-
-                # Scroll the bus information
-                print(f"Next 141: {bus_info_str} mins")
-                await scroll_msg(f"Next 141: {bus_info_str} mins")
+        # Only rebuilt when the data changes or a bus's minutes tick down. None if there's nothing to show.
+        display = config.my_cache.get_display(BUS_ITEMS)
+        if display.text is None:
+            raise Exception("Error: next buses data is expired or missing, or no arrivals at the bus stop")
+
+        # Scroll the bus information
+        print(display.text)
+        await scroll_msg(display.text, display)
 
     except Exception as e:
         print("Error:", e)
 
-async def scroll_piccadilly_line_status():
-    # print("scroll_piccadilly_line_status() called")
+async def scroll_tube_line_status():
+    # print("scroll_tube_line_status() called")
 
-    # Get line status from cache, if available
+    # Get the line status text the cache has prepared, if available
     try:
-        # Retrieve the line status data from the cache
-        line_status = config.my_cache.get("piccadilly_line_status")
-
-        # Check if the line status data is None (i.e. expired)
-        if line_status is None:
+        display = config.my_cache.get_display(LINE_ITEMS)
+        if display.text is None:
             raise Exception("Error: line status data is expired or missing")
         
         # Scroll the line status information
-        print(f"Scrolling Piccadilly line status: {line_status}")
-        await scroll_msg(f"Piccadilly line: {line_status}")
+        print(f"Scrolling line status: {display.text}")
+        await scroll_msg(display.text, display)
 
     except Exception as e:
-        print("Error:", e)
\ No newline at end of file
+        print("Error:", e)
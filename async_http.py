@@ -0,0 +1,350 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: async_http.py
+Description: A small HTTP/1.1 client built on uasyncio streams, with TLS. Yields to other coroutines while it
+connects, handshakes and reads, so fetches don't freeze the display the way blocking urequests does.
+An optional ConnectionPool keeps connections alive between requests to the same host. DNS lookups go through a
+cache shared with the NTP client.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import json
+import socket
+import utime  # type: ignore
+import uasyncio
+import config
+
+
+def parse_url(url):
+    # Split a URL into (scheme, host, port, path)
+    scheme, _, rest = url.partition("://")
+    host_port, slash, path = rest.partition("/")
+    host, _, port = host_port.partition(":")
+
+    if port:
+        port = int(port)
+    else:
+        port = 443 if scheme == "https" else 80
+
+    return scheme, host, port, slash + path if slash else "/"
+
+
+# Class to represent a response being read from the server. Has the same status_code and headers
+# attributes as a urequests response, but read(), json() and close() are coroutines.
+class HTTPResponse:
+    def __init__(self, reader, writer, timeout, pool=None, pool_key=None):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        # The connection goes back to the pool on close() if the body was read to the end and the server allows it
+        self.pool = pool
+        self.pool_key = pool_key
+        self.keep_alive = pool is not None
+        self.status_code = None
+        # Header names are lower case
+        self.headers = {}
+
+        # Body framing: Content-Length, chunked, or read until the server closes the connection
+        self.remaining = None
+        self.chunked = False
+        self.chunk_remaining = 0
+        self.done = False
+
+    async def readline(self):
+        return await uasyncio.wait_for(self.reader.readline(), self.timeout)
+
+    async def read_stream(self, size):
+        return await uasyncio.wait_for(self.reader.read(size), self.timeout)
+
+    async def read_head(self):
+        status_line = await self.readline()
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise OSError("invalid HTTP response")
+        self.status_code = int(parts[1])
+        if parts[0] != b"HTTP/1.1":
+            self.keep_alive = False
+
+        while True:
+            line = await self.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            self.headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in self.headers.get("transfer-encoding", "").lower():
+            self.chunked = True
+        elif "content-length" in self.headers:
+            self.remaining = int(self.headers["content-length"])
+        elif self.status_code not in (204, 304):
+            # Body runs until the server closes the connection
+            self.keep_alive = False
+
+        if "close" in self.headers.get("connection", "").lower():
+            self.keep_alive = False
+
+        if self.status_code in (204, 304) or self.remaining == 0:
+            self.done = True
+
+    # How many bytes of the body to read next, up to size. Reads the next chunk's size line if need be. 0 at the end.
+    async def next_read_size(self, size):
+        if self.done:
+            return 0
+
+        if self.chunked:
+            if self.chunk_remaining == 0:
+                size_line = await self.readline()
+                chunk_size = int(size_line.split(b";")[0].strip(), 16)
+                if chunk_size == 0:
+                    # Skip any trailers, up to the blank line that ends the body
+                    while (await self.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    self.done = True
+                    return 0
+                self.chunk_remaining = chunk_size
+            return min(size, self.chunk_remaining)
+
+        if self.remaining is not None:
+            return min(size, self.remaining)
+
+        return size
+
+    # Account for count bytes of the body just read
+    async def body_read(self, count):
+        if count == 0:
+            if self.chunked or self.remaining is not None:
+                raise OSError("connection closed before end of body")
+            self.done = True
+            return
+
+        if self.chunked:
+            self.chunk_remaining -= count
+            if self.chunk_remaining == 0:
+                # CRLF after the chunk data
+                await self.readline()
+        elif self.remaining is not None:
+            self.remaining -= count
+            if self.remaining == 0:
+                self.done = True
+
+    # Read up to size bytes of the body, or all of it if size is -1. Returns b"" at the end of the body.
+    async def read(self, size=-1):
+        if size < 0:
+            chunks = []
+            while True:
+                chunk = await self.read(1024)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+
+        size = await self.next_read_size(size)
+        if size == 0:
+            return b""
+
+        data = await self.read_stream(size)
+        await self.body_read(len(data))
+        return data
+
+    # Read the next part of the body into buf, a preallocated bytearray or memoryview, so reading doesn't allocate.
+    # Returns the number of bytes read, 0 at the end of the body.
+    async def readinto(self, buf):
+        size = await self.next_read_size(len(buf))
+        if size == 0:
+            return 0
+
+        if size < len(buf):
+            buf = memoryview(buf)[:size]
+
+        if hasattr(self.reader, "readinto"):
+            # MicroPython streams read straight into the buffer
+            count = await uasyncio.wait_for(self.reader.readinto(buf), self.timeout) or 0
+        else:
+            data = await self.read_stream(size)
+            count = len(data)
+            buf[:count] = data
+
+        await self.body_read(count)
+        return count
+
+    async def json(self):
+        return json.loads(await self.read())
+
+    async def close(self):
+        if self.keep_alive and self.done:
+            self.pool.release(self.pool_key, self.reader, self.writer)
+            return
+
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+# Class to represent a cache of DNS lookups. getaddrinfo blocks, and has no non-blocking form in MicroPython, so a
+# lookup is best done in a quiet window, where a pause doesn't show, and found in the cache when it's needed.
+class DNSCache:
+    def __init__(self, ttl=config.DNS_CACHE_TTL_SECS):
+        self.ttl = ttl
+        # Host -> (IPv4 address, expiry time)
+        self.entries = {}
+
+    # A host's IPv4 address if the last lookup is recent enough, else None. Doesn't block.
+    def get(self, host):
+        entry = self.entries.get(host)
+        if entry is not None and utime.time() < entry[1]:
+            return entry[0]
+        return None
+
+    # Look up a host's IPv4 address and cache it. Blocks for the lookup. Older firmware returns a raw sockaddr,
+    # which is returned as is and not cached.
+    def resolve(self, host, port):
+        sockaddr = socket.getaddrinfo(host, port, socket.AF_INET)[0][-1]
+        if not isinstance(sockaddr, tuple):
+            return sockaddr
+
+        self.entries[host] = (sockaddr[0], utime.time() + self.ttl)
+        return sockaddr[0]
+
+    # Look up any of the (host, port) pairs not in the cache, or due to expire within within_secs. Blocks, so call
+    # in a quiet window.
+    def refresh(self, addresses, within_secs=0):
+        for host, port in addresses:
+            entry = self.entries.get(host)
+            if entry is None or entry[1] - utime.time() <= within_secs:
+                try:
+                    self.resolve(host, port)
+                except OSError as e:
+                    print(f"DNS lookup for {host} failed: {e}")
+
+
+# The DNS cache the HTTP pool and the NTP client share
+dns_cache = DNSCache()
+
+
+# Class to represent a pool of idle keep-alive connections, one per (scheme, host, port) by default.
+# Pass to get() to reuse the connection (and TLS session) for the next request.
+class ConnectionPool:
+    def __init__(
+        self,
+        idle_timeout=config.HTTP_KEEPALIVE_IDLE_SECS,
+        max_idle_per_host=config.HTTP_POOL_MAX_IDLE_PER_HOST,
+        dns=None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_host = max_idle_per_host
+        # (scheme, host, port) -> list of idle (reader, writer, released_at)
+        self.idle = {}
+        # The shared DNS cache, unless one is given
+        self.dns = dns or dns_cache
+        # stale: pooled connections the server had closed by the time they were reused
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "dns_hits": 0, "dns_misses": 0}
+
+    # Take an idle connection for the key, or None if there isn't one still within the idle timeout
+    def acquire(self, key):
+        self.close_idle()
+        connections = self.idle.get(key)
+        if connections:
+            self.stats["hits"] += 1
+            reader, writer, _ = connections.pop()
+            return reader, writer
+
+        self.stats["misses"] += 1
+        return None
+
+    def release(self, key, reader, writer):
+        connections = self.idle.setdefault(key, [])
+        if len(connections) >= self.max_idle_per_host:
+            close_writer(writer)
+            return
+        connections.append((reader, writer, utime.time()))
+
+    # Close connections that have been idle too long. The server has probably dropped them anyway.
+    def close_idle(self, all_connections=False):
+        now = utime.time()
+        for key, connections in self.idle.items():
+            for connection in connections[:]:
+                if all_connections or now - connection[2] >= self.idle_timeout:
+                    connections.remove(connection)
+                    close_writer(connection[1])
+
+    # Look up a host's IPv4 address, from the cache if the lookup is recent enough
+    def resolve(self, host, port):
+        address = self.dns.get(host)
+        if address is not None:
+            self.stats["dns_hits"] += 1
+            return address
+
+        self.stats["dns_misses"] += 1
+        address = self.dns.resolve(host, port)
+        if not isinstance(address, str):
+            # Older firmware returns a raw sockaddr, so let open_connection look the host up itself
+            return host
+        return address
+
+    def print_report(self):
+        stats = self.stats
+        print(
+            f"HTTP pool: {stats['hits']} hits, {stats['misses']} misses, {stats['stale']} stale, "
+            f"DNS {stats['dns_hits']} hits, {stats['dns_misses']} misses"
+        )
+
+
+def close_writer(writer):
+    try:
+        writer.close()
+    except OSError:
+        pass
+
+
+async def send_request(reader, writer, request, timeout, pool=None, pool_key=None):
+    response = HTTPResponse(reader, writer, timeout, pool, pool_key)
+
+    try:
+        writer.write(request)
+        await uasyncio.wait_for(writer.drain(), timeout)
+
+        await response.read_head()
+    except BaseException:
+        response.keep_alive = False
+        await response.close()
+        raise
+
+    return response
+
+
+# Send a GET request and read the status line and headers. The caller reads the body and must close() the response.
+# ssl is passed to uasyncio.open_connection for https URLs: True for the default TLS context, or an SSLContext.
+# With a pool, an idle connection to the same host is reused if there is one, and the connection is kept alive.
+async def get(url, headers=None, timeout=10, ssl=True, pool=None):
+    scheme, host, port, path = parse_url(url)
+    pool_key = (scheme, host, port)
+
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: {'keep-alive' if pool else 'close'}\r\n"
+    if headers:
+        for name, value in headers.items():
+            request += f"{name}: {value}\r\n"
+    request = (request + "\r\n").encode()
+
+    address = host
+    if pool is not None:
+        connection = pool.acquire(pool_key)
+        if connection is not None:
+            try:
+                return await send_request(connection[0], connection[1], request, timeout, pool, pool_key)
+            except OSError:
+                # The server closed the connection while it was idle, so make a new one. GET is safe to resend.
+                pool.stats["stale"] += 1
+
+        address = pool.resolve(host, port)
+
+    if scheme == "https":
+        # Connect to the cached address, but check the certificate against the host name
+        connect = uasyncio.open_connection(address, port, ssl=ssl, server_hostname=host)
+    else:
+        connect = uasyncio.open_connection(address, port)
+    reader, writer = await uasyncio.wait_for(connect, timeout)
+
+    return await send_request(reader, writer, request, timeout, pool, pool_key)
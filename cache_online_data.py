@@ -7,155 +7,458 @@ Description: A cache object that stores online data, and provides methods to set
 GitHub Repository: https://github.com/Pharkie/AdamGalactic/
 License: GNU General Public License (GPL)
 """
+import os
 import utime # type: ignore
 import uasyncio
+import json
+import struct
 import config
 import utils
-import urequests # type: ignore
+import async_http
 import temp_etc_utils
-
-# Class to represent the online data cache object
+import json_stream
+import data_sources
+import circuit_breaker
+import refresh_scheduler
+
+# Returned by __get_JSON_items() when the server answers 304, i.e. our cached copy is still current
+NOT_MODIFIED = "not modified"
+
+# Snapshot file layout, all little endian:
+#   header: b"AGDC", version (B), saved_at time (I), item count (B)
+#   item:   name length (B), expiry time (I), value length (H), then the name and the value as JSON
+SNAPSHOT_MAGIC = b"AGDC"
+SNAPSHOT_VERSION = 3  # 2: next_buses holds arrival times, not minutes. 3: an item per bus route and tube line.
+SNAPSHOT_HEADER_FORMAT = "<4sBIB"
+SNAPSHOT_ITEM_FORMAT = "<BIH"
+
+# Read size bytes from a snapshot file. Raises ValueError if it's cut short, e.g. by a power cut while it was written.
+def read_exactly(snapshot_file, size):
+    data = snapshot_file.read(size)
+    if len(data) != size:
+        raise ValueError("snapshot truncated")
+    return data
+
+# Class to represent the display-ready form of one or more cache items shown together, e.g. all the bus routes.
+# Rebuilt only when the text of one of its items changes, which bumps version, so display code can tell cheaply.
+class PreparedDisplay:
+    def __init__(self, cache_items):
+        self.cache_items = cache_items
+        # Text version of each item when the text was built, None for items with nothing to show
+        self.item_versions = [None] * len(cache_items)
+        # The items' texts joined, or None if there's nothing to show
+        self.text = None
+        self.version = 0
+        # The text rendered as a pixel strip, kept by utils.scroll_msg() the first time it scrolls the text.
+        # Not rendered at update time, as rendering uses the framebuffer, which may be showing something else.
+        self.strip = None
+        # The text's width in pixels, kept by utils.scroll_msg() along with the strip
+        self.width = None
+
+# Class to represent the online data cache object. Holds the items of each data source in the registry
+# (data_sources.py). A source may fill several items from one fetch, e.g. one item per bus route.
 class OnlineDataCache:
-    def __init__(self):
-        self.custom_message = None
-        self.custom_message_last_updated = None
-        self.piccadilly_line_status = None
-        self.piccadilly_line_status_last_updated = None
-        self.next_buses = None
-        self.next_buses_last_updated = None
-        self.cache_expiry = {
-            "custom_message": None,
-            "piccadilly_line_status": None,
-            "next_buses": None
-        }
-        self.cache_expiry_times = {
-            "custom_message": config.CACHE_EXPIRY_TIMES[0],
-            "piccadilly_line_status": config.CACHE_EXPIRY_TIMES[1],
-            "next_buses": config.CACHE_EXPIRY_TIMES[2]
-        }
-
-    # Check if a cache item is expired
-    def is_expired(self, cache_item):
-        return self.cache_expiry[cache_item] is not None and self.cache_expiry[cache_item] < utime.time()
-
-    # Set the cache item with new data and expiry time
+    def __init__(self, sources=None):
+        if sources is None:
+            sources = data_sources.default_sources()
+        # Source name -> DataSource, and each cache item's source name
+        self.sources = {}
+        self.item_sources = {}
+        # Per cache item
+        self.data = {}
+        self.last_updated = {}
+        # Bytes each item takes as JSON
+        self.memory_used = {}
+        # Display text formatted from the data when it changes, when it goes out of date (None for never), and a
+        # counter bumped each time it changes
+        self.texts = {}
+        self.text_valid_until = {}
+        self.text_versions = {}
+        # Per source, as the items of a source are fetched together
+        self.cache_expiry = {}
+        # How many values were dropped for going over the source's memory budget
+        self.values_dropped = {}
+        # Failure tracking, so fetches that are bound to fail are skipped
+        self.breakers = {}
+        # Each source's JSON scanner, with its buffers, and the buffer its responses are read into, allocated once
+        # up front. Not shared, as the fetches run at once and each can await between filling and scanning its buffer.
+        self.scanners = {}
+        self.receive_buffers = {}
+        self.updaters = {}
+        for source in sources:
+            self.sources[source.name] = source
+            for cache_item in source.items:
+                self.item_sources[cache_item] = source.name
+                self.data[cache_item] = None
+                self.last_updated[cache_item] = None
+                self.memory_used[cache_item] = 0
+                self.texts[cache_item] = None
+                self.text_valid_until[cache_item] = None
+                self.text_versions[cache_item] = 0
+            self.cache_expiry[source.name] = None
+            self.values_dropped[source.name] = 0
+            self.breakers[source.name] = circuit_breaker.CircuitBreaker()
+            self.scanners[source.name] = json_stream.JSONKeyScanner(source.keys, None, source.memory_budget)
+            self.receive_buffers[source.name] = bytearray(config.HTTP_CHUNK_SIZE)
+            self.updaters[source.name] = self.make_updater(source.name)
+        # HTTP validators from the last full response for each source: (ETag, Last-Modified)
+        self.validators = {}
+        # Tuple of cache items shown together -> PreparedDisplay
+        self.displays = {}
+        # Keep-alive connections and DNS lookups shared by all the updaters
+        self.http_pool = async_http.ConnectionPool()
+        # For writing the snapshot to flash sparingly
+        self.snapshot_dirty = False
+        self.snapshot_saved_at = None
+
+    # The source name for a cache item or source name
+    def source_of(self, name):
+        return self.item_sources.get(name, name)
+
+    # Check if a cache item (or source) is expired (soft expiry: it may still be served stale)
+    def is_expired(self, name):
+        expiry_time = self.cache_expiry[self.source_of(name)]
+        return expiry_time is not None and expiry_time < utime.time()
+
+    # Check if a cache item (or source) is past its hard expiry, after which it is never served
+    def is_hard_expired(self, name):
+        source_name = self.source_of(name)
+        expiry_time = self.cache_expiry[source_name]
+        return expiry_time is not None and expiry_time + self.sources[source_name].stale_grace_secs < utime.time()
+
+    # Set the cache item with new data, and its source's expiry time
     def set(self, cache_item, data, expiry_time):
-        setattr(self, cache_item, data)
-        self.cache_expiry[cache_item] = expiry_time
-
-    # Retrieve the cached item, or None if expired
+        # The snapshot holds the expiry too, so a refresh with the same data still needs saving
+        if data != self.data[cache_item] or expiry_time != self.cache_expiry[self.item_sources[cache_item]]:
+            self.snapshot_dirty = True
+        self.data[cache_item] = data
+        self.last_updated[cache_item] = utime.time()
+        self.cache_expiry[self.item_sources[cache_item]] = expiry_time
+        self.memory_used[cache_item] = len(json.dumps(data))
+        self.prepare_text(cache_item, utime.time())
+
+    # Format a cache item's display text from its data, bumping its text version if the text has changed
+    def prepare_text(self, cache_item, now):
+        data = self.data[cache_item]
+        text = None
+        valid_until = None
+        if data is not None:
+            text, valid_until = self.sources[self.item_sources[cache_item]].format_text(cache_item, data, now)
+
+        if text != self.texts[cache_item]:
+            self.texts[cache_item] = text
+            self.text_versions[cache_item] += 1
+        self.text_valid_until[cache_item] = valid_until
+
+    # Write the items and their expiry times to flash, so a reboot can show them straight away.
+    # Skipped unless the data or an expiry has changed, and at most once per config.CACHE_SNAPSHOT_MIN_INTERVAL, to limit flash wear.
+    def save_snapshot(self, force=False):
+        now = utime.time()
+        if not force and (
+            not self.snapshot_dirty
+            or (self.snapshot_saved_at is not None and now - self.snapshot_saved_at < config.CACHE_SNAPSHOT_MIN_INTERVAL)
+        ):
+            return False
+
+        items = [cache_item for cache_item in self.item_sources if self.data[cache_item] is not None]
+
+        # Written to a temporary file, then renamed over the old snapshot, so a power cut mid write leaves the
+        # old snapshot whole
+        temp_path = config.CACHE_SNAPSHOT_PATH + ".tmp"
+        try:
+            with open(temp_path, "wb") as snapshot_file:
+                snapshot_file.write(struct.pack(SNAPSHOT_HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, now, len(items)))
+                for cache_item in items:
+                    name = cache_item.encode()
+                    value = json.dumps(self.data[cache_item]).encode()
+                    expiry_time = self.cache_expiry[self.item_sources[cache_item]]
+                    snapshot_file.write(struct.pack(SNAPSHOT_ITEM_FORMAT, len(name), expiry_time, len(value)))
+                    snapshot_file.write(name)
+                    snapshot_file.write(value)
+            try:
+                os.rename(temp_path, config.CACHE_SNAPSHOT_PATH)
+            except OSError:
+                # Some filesystems won't rename over an existing file
+                os.remove(config.CACHE_SNAPSHOT_PATH)
+                os.rename(temp_path, config.CACHE_SNAPSHOT_PATH)
+        except OSError as e:
+            print(f"Failed to save cache snapshot: {e}")
+            return False
+
+        self.snapshot_dirty = False
+        self.snapshot_saved_at = now
+        return True
+
+    # Load the items from the flash snapshot that are within their grace time (stale or not). Needs the RTC to be set.
+    # Returns the names of the items loaded.
+    def load_snapshot(self):
+        loaded = []
+        try:
+            with open(config.CACHE_SNAPSHOT_PATH, "rb") as snapshot_file:
+                magic, version, saved_at, item_count = struct.unpack(
+                    SNAPSHOT_HEADER_FORMAT, read_exactly(snapshot_file, struct.calcsize(SNAPSHOT_HEADER_FORMAT))
+                )
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    raise ValueError("not a cache snapshot, or an unsupported version")
+
+                now = utime.time()
+                # If the clock reads earlier than the save, it hasn't been set since power up, so we can't judge expiry
+                if now < saved_at:
+                    raise ValueError("clock not set")
+
+                for _ in range(item_count):
+                    name_length, expiry_time, value_length = struct.unpack(
+                        SNAPSHOT_ITEM_FORMAT, read_exactly(snapshot_file, struct.calcsize(SNAPSHOT_ITEM_FORMAT))
+                    )
+                    cache_item = read_exactly(snapshot_file, name_length).decode()
+                    value = json.loads(read_exactly(snapshot_file, value_length))
+
+                    # Loaded until the hard expiry: a stale item is shown while the refresh scheduler, which has it
+                    # due already, fetches it
+                    source_name = self.item_sources.get(cache_item)
+                    if source_name is not None and expiry_time + self.sources[source_name].stale_grace_secs >= now:
+                        self.data[cache_item] = value
+                        self.last_updated[cache_item] = saved_at
+                        self.cache_expiry[source_name] = expiry_time
+                        self.memory_used[cache_item] = value_length
+                        self.prepare_text(cache_item, now)
+                        loaded.append(cache_item)
+
+        except (OSError, ValueError) as e:
+            print(f"Cache snapshot not loaded: {e}")
+
+        self.snapshot_saved_at = utime.time() if loaded else None
+        return loaded
+
+    # Retrieve the cached item, or None if missing or past its hard expiry.
+    # Returns (data, age_secs, is_stale). A stale item's source is already due in the refresh scheduler, which
+    # queues refreshes by expiry, so it's refreshed in the next quiet window.
+    def get_with_age(self, cache_item):
+        data = self.data[cache_item]
+        if data is None or self.is_hard_expired(cache_item):
+            return None, None, False
+
+        age_secs = utime.time() - self.last_updated[cache_item]
+        return data, age_secs, self.is_expired(cache_item)
+
+    # Retrieve the cached item, stale or not, or None if missing or past its hard expiry
     def get(self, cache_item):
-        if self.is_expired(cache_item):
-            return None
+        return self.get_with_age(cache_item)[0]
+
+    # The prepared display for cache items shown together (a tuple, so it can be the key), with the items' texts
+    # joined. Reuses the text (and strip) built last time unless an item's text has changed since.
+    # Like get(), leaves out items past their hard expiry.
+    def get_display(self, cache_items):
+        display = self.displays.get(cache_items)
+        if display is None:
+            display = PreparedDisplay(cache_items)
+            self.displays[cache_items] = display
+
+        now = utime.time()
+        changed = False
+        for index in range(len(cache_items)):
+            cache_item = cache_items[index]
+            version = None
+            if self.get(cache_item) is not None:
+                valid_until = self.text_valid_until[cache_item]
+                if valid_until is not None and now >= valid_until:
+                    self.prepare_text(cache_item, now)
+                if self.texts[cache_item] is not None:
+                    version = self.text_versions[cache_item]
+
+            if version != display.item_versions[index]:
+                display.item_versions[index] = version
+                changed = True
+
+        if changed:
+            texts = [
+                self.texts[cache_items[index]]
+                for index in range(len(cache_items))
+                if display.item_versions[index] is not None
+            ]
+            text = ". ".join(texts) if texts else None
+            if text != display.text:
+                display.text = text
+                display.version += 1
+                display.strip = None
+                display.width = None
+
+        return display
+
+    # Remember the ETag and Last-Modified headers of a response, to make the next request for the source conditional
+    def remember_validators(self, source_name, headers):
+        etag = None
+        last_modified = None
+        for name, value in headers.items():
+            name = name.lower()
+            if name == "etag":
+                etag = value
+            elif name == "last-modified":
+                last_modified = value
+
+        if etag is None and last_modified is None:
+            self.validators.pop(source_name, None)
         else:
-            return getattr(self, cache_item)
-    
-    async def __get_JSON_data(self, api_url):
-        # print(f"__get_JSON_data() called with {api_url}")
+            self.validators[source_name] = (etag, last_modified)
+
+    # Request headers that ask the server to reply 304 if the source hasn't changed since we last fetched it
+    def get_conditional_headers(self, source_name):
+        headers = {}
+        # Only worth asking if we still hold the data to keep using
+        if source_name not in self.validators or any(
+            self.data[cache_item] is None for cache_item in self.sources[source_name].items
+        ):
+            return headers
+
+        etag, last_modified = self.validators[source_name]
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    # Extend the expiry of a source the server says hasn't changed, without fetching or parsing it again
+    def extend_expiry(self, source_name, expiry_secs):
+        self.cache_expiry[source_name] = utime.time() + expiry_secs
+        self.snapshot_dirty = True
+        print(f"Success. {source_name} not modified, expiry extended")
+
+    async def __get_JSON_items(self, source_name, on_item, timeout=10):
+        # Read the source's response into its preallocated receive buffer and scan it in place, passing only the
+        # requested keys of each array element (or of the object) to on_item. Heap use doesn't grow with the size
+        # of the response, and refreshes don't leave fresh allocations behind to fragment the heap.
+        # The request is conditional on the source's validators. Returns NOT_MODIFIED on a 304.
+        source = self.sources[source_name]
         try:
             if not utils.is_wifi_connected():
                 raise Exception("Wi-Fi is not connected")
 
-            # Make the API request to get the data
+            # Yields to the display while it connects and reads
+            response = await async_http.get(source.url, headers=self.get_conditional_headers(source_name), timeout=timeout, pool=self.http_pool)
             try:
-                response = urequests.get(api_url, timeout=10)
-                responseJSON = response.json()
-                # Essential or we get ENOMEM errors. Don't switch for one line responseJSON = urequests.get().json()
-                response.close()
-            except ValueError:
-                raise Exception("invalid JSON response from API")
-
-            return responseJSON
-
-        except Exception as e:
-            raise Exception(f"Failed to get JSON data from API: {e}")
+                if response.status_code == 304:
+                    return NOT_MODIFIED
 
-    async def update_next_buses_cache(self):
-        # print("update_next_buses_cache() called")
+                if response.status_code != 200:
+                    raise Exception(f"HTTP status {response.status_code}")
 
-        try:
-            # Get the next bus information from the TFL API
-            next_buses_data = await self.__get_JSON_data(config.next_buses_URL)
-
-            # Extract the bus information from next_buses_data JSON
-            bus_info = []
-            for bus in next_buses_data:
-                if bus.get("lineName") == "141":
-                    time_to_station = bus["timeToStation"] // 60
-                    bus_info.append(time_to_station)
-
-            if bus_info is None:
-                raise Exception("bus_info is empty")
-
-            # Sort the times in ascending order
-            bus_info.sort()
-
-            # Set the cache with the bus information
-            expiry_time = utime.time() + config.CACHE_EXPIRY_TIMES[0][1]
-            self.set("next_buses", bus_info, expiry_time)
-            print(f"Success. Updated next buses cache with: {bus_info}")
-        except Exception as e:
-            print(f"Failed to get next bus information from API: {e}")
+                # Don't start reading a body that is bound to go over the cap
+                if int(response.headers.get("content-length", 0)) > source.max_response_bytes:
+                    raise Exception(f"response over {source.max_response_bytes} bytes")
 
-    async def update_line_status_cache(self):
-        # print("update_line_status_cache() called")
+                scanner = self.scanners[source_name]
+                scanner.reset(on_item)
+                await json_stream.scan_response(response, scanner, self.receive_buffers[source_name], source.max_response_bytes)
 
-        try:
-            # Get the line status data from the TFL API
-            line_status_data = await self.__get_JSON_data(config.piccadilly_line_status_URL)
+                self.remember_validators(source_name, response.headers)
+            except ValueError as e:
+                raise Exception(f"invalid JSON response from API: {e}")
+            finally:
+                # Essential or we get ENOMEM errors
+                await response.close()
 
-            # Find the status of the specified line
-            line_status = None
-            for line in line_status_data:
-                if line["id"] == "piccadilly":
-                    line_status = line["lineStatuses"][0]["statusSeverityDescription"]
-                    break
+        except Exception as e:
+            raise Exception(f"Failed to get JSON data from API: {e}")
 
-            if line_status is None:
-                raise Exception("could not retrieve piccadilly line status")
+    def make_updater(self, source_name):
+        async def updater():
+            await self.update_source(source_name)
+        return updater
 
-            # Set the cache with the line status
-            expiry_time = utime.time() + config.CACHE_EXPIRY_TIMES[1][1]
-            self.set("piccadilly_line_status", line_status, expiry_time)
-            print(f"Success. Updated Piccadilly line status cache with: {line_status}")
+    # Fetch a source and update its cache items in one pass, keeping its values within the source's memory budget
+    async def update_source(self, source_name):
+        # print(f"update_source() called with {source_name}")
+        source = self.sources[source_name]
+        breaker = self.breakers[source_name]
 
-        except Exception as e:
-            print(f"Failed to get tube line status data from API: {e}")
+        if not breaker.allow():
+            print(f"Skipped {source_name} update: circuit {breaker.state}, retry in {breaker.retry_after()}s")
+            return
 
-    # Retrieve the custom message
-    async def update_custom_message_cache(self):
-        # print("update_custom_message_cache() called")
+        # A probe of a source that has been failing gets a short timeout, as it's likely to fail again
+        timeout = config.CIRCUIT_PROBE_TIMEOUT_SECS if breaker.is_probing() else 10
 
         try:
-            # Get the custom message from the API
-            message_info = await self.__get_JSON_data(config.custom_message_gist_URL)
+            values = []
+            values_bytes = 0
+            values_dropped = 0
+            fetch_time = utime.time()
+
+            # Called for each item as it is read, with only the keys the source needs
+            def on_item(item):
+                nonlocal values_bytes, values_dropped
+                value = source.select(item, fetch_time)
+                if value is None:
+                    return
+
+                value_bytes = len(json.dumps(value)) + 1
+                if values_bytes + value_bytes > source.memory_budget:
+                    values_dropped += 1
+                    # The source may rather drop a value it already kept, e.g. a later bus for a sooner one
+                    index = source.evict(values, value) if source.evict is not None else None
+                    if index is None:
+                        return
+                    evicted_bytes = len(json.dumps(values[index])) + 1
+                    if values_bytes - evicted_bytes + value_bytes > source.memory_budget:
+                        return
+                    values_bytes += value_bytes - evicted_bytes
+                    values[index] = value
+                    return
+
+                values_bytes += value_bytes
+                values.append(value)
+
+            result = await self.__get_JSON_items(source_name, on_item, timeout)
+
+            if result is NOT_MODIFIED:
+                breaker.record_success()
+                self.extend_expiry(source_name, source.ttl_secs)
+                return
+
+            # Cache item -> data, for every item of the source
+            item_data = source.finish(values)
+
+            if values_dropped:
+                self.values_dropped[source_name] += values_dropped
+                print(f"{source_name}: dropped {values_dropped} values over the {source.memory_budget} byte memory budget")
+
+            breaker.record_success()
+            expiry_time = utime.time() + source.ttl_secs
+            for cache_item, data in item_data.items():
+                self.set(cache_item, data, expiry_time)
+            print(f"Success. Updated {source_name} cache with: {item_data}")
 
-            # Extract the message text from the JSON data
-            message_text = message_info["custom_message"]
+        except Exception as e:
+            breaker.record_failure()
+            print(f"Failed to update {source_name} cache: {e}")
 
-            if message_text is None:
-                raise Exception("custom message is empty")
+        finally:
+            # Cancelled mid probe, e.g. by the end of a quiet window
+            breaker.abandon_probe()
 
-            # Set the cache with the message text
-            expiry_time = utime.time() + config.CACHE_EXPIRY_TIMES[2][1]
-            self.set("custom_message", message_text, expiry_time)
-            print(f"Success. Updated custom message with: {message_text}")
+    # Seconds until a source will be fetched again, 0 unless its circuit is open
+    def retry_after(self, source_name):
+        return self.breakers[source_name].retry_after()
 
-        except Exception as e:
-            print(f"Failed to get custom message from Gist: {e}")
+    def print_circuit_report(self):
+        print("Source circuits:")
+        for source_name, breaker in self.breakers.items():
+            print(f"  {source_name}: {breaker.report()}")
 
     # Update each item in the cache data
     async def update_all_cache(self):
         print("update_all_cache() called")
 
-        await uasyncio.gather(
-            self.update_next_buses_cache(),
-            self.update_line_status_cache(),
-            self.update_custom_message_cache()
-        )
+        await uasyncio.gather(*[updater() for updater in self.updaters.values()])
 
         print(f"Success: all cache updated")
 
+    def print_memory_report(self):
+        print("Cache memory: bytes used / budget, values dropped")
+        for source_name, source in self.sources.items():
+            memory_used = sum(self.memory_used[cache_item] for cache_item in source.items)
+            print(f"  {source_name}: {memory_used} / {source.memory_budget}, {self.values_dropped[source_name]}")
+
 # Function to update the cache periodically
 # async def update_cache_periodically():
 #     while True:
@@ -180,11 +483,21 @@ async def main():
     # Populate the global cache instance with a new cache object
     config.my_cache = OnlineDataCache()
 
-    utils.clear_picoboard()
-    utils.show_static_message("Syncing..", config.PEN_BLUE, 0.2)
-    # temp_etc_utils.show_temp()
-    print("Updating cache at startup (blocking)")
-    await config.my_cache.update_all_cache()
+    # Warm boot: show what is still within its grace time from flash straight away. Anything stale or missing is
+    # refreshed by the scheduler.
+    loaded = config.my_cache.load_snapshot()
+    if loaded:
+        print(f"Loaded from cache snapshot: {loaded}")
+    else:
+        utils.clear_picoboard()
+        utils.show_static_message("Syncing..", config.PEN_BLUE, 0.2)
+        # temp_etc_utils.show_temp()
+        print("Updating cache at startup (blocking)")
+        await config.my_cache.update_all_cache()
+        config.my_cache.save_snapshot(force=True)
+
+    # From here on, refreshes are run by deadline in the quiet windows of static displays
+    config.my_refresh_scheduler = refresh_scheduler.RefreshScheduler(config.my_cache)
 
     utils.clear_picoboard()
 
@@ -198,9 +511,9 @@ async def run_main_async():
 
     await main()
 
-    print(f"\nNext buses gets as: {config.my_cache.get('next_buses')}")
-    print(f"Line status gets as: {config.my_cache.get('piccadilly_line_status')}")
-    print(f"Custom message gets as: {config.my_cache.get('custom_message')}")
+    for cache_item in config.my_cache.item_sources:
+        print(f"{cache_item} gets as: {config.my_cache.get(cache_item)}")
+    config.my_cache.print_memory_report()
 
 if __name__ == "__main__":
     uasyncio.run(run_main_async())
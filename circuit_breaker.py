@@ -0,0 +1,94 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: circuit_breaker.py
+Description: Failure tracker for an online data source. After a few failures in a row the circuit opens and fetches
+are skipped at once, for a backoff that doubles with each failure (with jitter). When the backoff is up, one probe
+fetch is let through (half open): success closes the circuit, failure opens it again for longer.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import utime  # type: ignore
+import urandom  # type: ignore
+import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half open"
+
+
+# Class to represent the circuit breaker object for one source
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+        backoff_base_secs=config.CIRCUIT_BACKOFF_BASE_SECS,
+        backoff_max_secs=config.CIRCUIT_BACKOFF_MAX_SECS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.backoff_base_secs = backoff_base_secs
+        self.backoff_max_secs = backoff_max_secs
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        # When an open circuit lets a probe through
+        self.retry_at = None
+        # Totals, for the report
+        self.failures = 0
+        self.skipped = 0
+        self.opened = 0
+
+    # Whether to try a fetch now. An open circuit past its backoff goes half open and lets one probe through.
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and utime.time() >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+
+        # Still backing off, or a probe is already in flight
+        self.skipped += 1
+        return False
+
+    def is_probing(self):
+        return self.state == HALF_OPEN
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.retry_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            # Double the backoff for each failure past the threshold, up to the maximum
+            doublings = min(self.consecutive_failures - self.failure_threshold, 16)
+            backoff_secs = min(self.backoff_base_secs << max(doublings, 0), self.backoff_max_secs)
+            # Jitter between half and all of the backoff, so the sources don't all probe at once
+            backoff_secs = backoff_secs // 2 + urandom.randint(0, backoff_secs // 2)
+
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self.retry_at = utime.time() + backoff_secs
+
+    # The probe was cancelled before it finished, so let the next fetch probe instead
+    def abandon_probe(self):
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self.retry_at = utime.time()
+
+    # Seconds until a fetch will be let through, 0 if now
+    def retry_after(self):
+        if self.state != OPEN:
+            return 0
+        return max(0, self.retry_at - utime.time())
+
+    def report(self):
+        return (
+            f"{self.state}, {self.consecutive_failures} failures in a row, retry in {self.retry_after()}s, "
+            f"{self.failures} failed, {self.skipped} skipped, opened {self.opened} times"
+        )
@@ -18,6 +18,7 @@ gu = GalacticUnicorn()
 picoboard = PicoGraphics(DISPLAY)
 
 DISPLAY_WIDTH = 53
+DISPLAY_HEIGHT = 11
 
 # Pen colours
 PEN_BLACK = picoboard.create_pen(0, 0, 0)
@@ -26,7 +27,11 @@ PEN_GREY = picoboard.create_pen(96, 96, 96)
 PEN_BLUE = picoboard.create_pen(153, 255, 255)
 PEN_GREEN = picoboard.create_pen(38, 133, 40)
 
-picoboard.set_font("bitmap6")
+FONT = "bitmap6"
+picoboard.set_font(FONT)
+
+# Max number of text layouts (widths and line splits) to remember
+LAYOUT_CACHE_SIZE = 16
 
 # BME680 stuff
 BME_ENABLED = False
@@ -45,6 +50,14 @@ from wifi_creds import WIFI_SSID, WIFI_PASSWORD
 
 CHANGE_INTERVAL = 6  # seconds
 
+# Scroll from a pre-rendered 1-bit strip rather than re-rendering the whole message each frame
+SCROLL_WITH_STRIP = True
+SCROLL_FPS = 33  # Target frame rate for scrolling text, one pixel per frame
+
+# Profile each attract mode task and print the table after each round of tasks
+PROFILE_ATTRACT_TASKS = False
+PROFILE_MAX_TASKS = 12
+
 base_x = 9
 char_width = 5
 char_height = 5
@@ -60,19 +73,58 @@ clock_digits_x = [
 clock_digit_all_y = -1
 
 custom_message_gist_URL = "https://gist.githubusercontent.com/Pharkie/b411446bb13e8d9c73500d09b66862a2/raw/CustomMessage.txt"
-next_buses_URL = "https://api.tfl.gov.uk/Line/141/Arrivals/490008766S"
-piccadilly_line_status_URL = "https://api.tfl.gov.uk/Line/piccadilly/Status"
+# TFL requests cover all the routes (or lines) at once, with comma separated ids
+TFL_API_URL = "https://api.tfl.gov.uk"
+TFL_BUS_STOP_ID = "490008766S"
+TFL_BUS_ROUTES = ("141",)  # bus routes to show arrivals for at the stop
+TFL_TUBE_LINES = ("piccadilly",)  # tube lines to show the status of
 
 DEFAULT_CUSTOM_MESSAGE = "Next stop: Penmaenmawr"
 
 # Make a global instance of the cache object, so it can be used by multiple modules.
 # Variable is populated in cache_online_data.main()
 my_cache = None  # type: ignore
+my_refresh_scheduler = None  # type: ignore
 
 CACHE_REFRESH_INTERVAL = 60  # seconds
 
-CACHE_EXPIRY_TIMES = (
-    ("next_buses", 1 * 60),  # 1 minutes
-    ("line_status", 5 * 60),  # 10 minutes
-    ("custom_message", 60 * 60),  # 60 minutes
-)
+HTTP_CHUNK_SIZE = 512  # size of the receive buffer each source's JSON responses are read into and scanned from
+# Keep-alive connections to the TFL API and the Gist, reused by back to back refreshes
+HTTP_KEEPALIVE_IDLE_SECS = 60  # close a pooled connection after this long unused
+HTTP_POOL_MAX_IDLE_PER_HOST = 1  # each idle TLS connection holds tens of KB of RAM
+DNS_CACHE_TTL_SECS = 5 * 60
+
+# The TTL, stale grace time and memory budget of each cached item are declared with its source in data_sources.py
+
+# Circuit breaker for each source: after this many failures in a row, skip its fetches for a backoff that doubles
+# with each further failure, then let one probe through with a short timeout
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_BACKOFF_BASE_SECS = 30
+CIRCUIT_BACKOFF_MAX_SECS = 30 * 60  # 30 minutes
+CIRCUIT_PROBE_TIMEOUT_SECS = 4
+
+# The RTC is set from whichever of these NTP servers answers with the shortest round trip. They're asked at once.
+NTP_SERVERS = ("0.uk.pool.ntp.org", "1.uk.pool.ntp.org", "time.google.com")
+NTP_TIMEOUT_MS = 2000  # give up on a server that hasn't answered in this long
+NTP_POLL_MS = 10  # how often to check for answers, letting the display run in between
+NTP_RETRY_SECS = 5 * 60  # wait after a failed sync
+# Between syncs the RTC is stepped to follow its measured drift. The sync interval adapts to keep the error in bounds.
+RTC_MAX_ERROR_MS = 1000  # sync more often if the RTC is found further than this from NTP time
+RTC_SYNC_INITIAL_SECS = 60 * 60
+RTC_SYNC_MIN_SECS = 15 * 60
+RTC_SYNC_MAX_SECS = 24 * 60 * 60
+RTC_DRIFT_SMOOTHING = 0.3  # weight of the newest drift measurement in the estimate
+
+# Cache refreshes run in quiet (static display) windows. Refresh anything expiring within the lookahead,
+# as the next quiet window may be that far away.
+REFRESH_LOOKAHEAD_SECS = 45
+REFRESH_MAX_PER_WINDOW = 2
+# Wait after a failed refresh. Longer than the lookahead, or a failed item would be due again straight away.
+REFRESH_RETRY_SECS = 90
+# Fetches yield to the display (async_http), so refreshes can also run in a background task alongside scrolling
+# and the clock, instead of waiting for a static display
+REFRESH_IN_BACKGROUND = False
+
+# Snapshot of the cache on flash, for a warm boot. Written at most this often, to limit flash wear.
+CACHE_SNAPSHOT_PATH = "cache_snapshot.bin"
+CACHE_SNAPSHOT_MIN_INTERVAL = 15 * 60  # 15 minutes
@@ -0,0 +1,203 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: data_sources.py
+Description: Registry of the online data sources held by the cache. Each source declares its URL, the cache items it
+fills, the JSON keys to pick out as the response streams in, how to turn them into the cached values, its TTL and its
+memory budget. TFL sources cover several routes or lines with one request. Add a feed by adding a source to
+default_sources(), or a route or line in config.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import config
+import datetime_utils
+import TFL
+
+
+# Class to represent one online data source
+class DataSource:
+    def __init__(
+        self,
+        name,
+        items,
+        url,
+        keys,
+        select,
+        finish,
+        ttl_secs,
+        stale_grace_secs,
+        memory_budget,
+        max_response_bytes,
+        format_text=None,
+        evict=None,
+    ):
+        self.name = name
+        # Names of the cache items the source fills
+        self.items = items
+        self.url = url
+        # Keys picked out of each element of the JSON array (or of the JSON object) as it is read
+        self.keys = keys
+        # select(item, fetch_time) returns the value to keep from an item, or None to skip it
+        self.select = select
+        # finish(values) turns the kept values into a dict of cache item -> value, with every one of the source's items
+        # (None for one the response left out), or raises if there's nothing usable
+        self.finish = finish
+        self.ttl_secs = ttl_secs
+        # How long past its expiry the value may still be shown (stale) while the refresh scheduler fetches it
+        self.stale_grace_secs = stale_grace_secs
+        # Most bytes the cached values may take, measured as JSON. Values past it are dropped as they arrive,
+        # unless evict says otherwise.
+        self.memory_budget = memory_budget
+        # Longest response to read. Anything longer fails the fetch rather than tying up the connection.
+        self.max_response_bytes = max_response_bytes
+        # format_text(item, data, now) returns (display text or None, time the text goes out of date or None).
+        # Called when the data changes, and again once the text goes out of date.
+        self.format_text = format_text if format_text is not None else plain_text
+        # evict(values, value) is called when value won't fit the memory budget. Returns the index of a kept value
+        # that's less use, for value to replace, or None to drop value. For sources whose values have an order of
+        # usefulness, as the response may not come in that order.
+        self.evict = evict
+
+
+def plain_text(cache_item, data, now):
+    return str(data), None
+
+
+def first_value(values):
+    if not values:
+        raise Exception("no value found in response")
+    return values[0]
+
+
+# Expected arrival times at a stop for each of the bus routes, on the RTC's clock, soonest first.
+# One request covers all the routes, so the memory budget and response cap are per route. Each route gets its own
+# cache item, empty if no bus is due.
+def bus_arrivals_source(
+    name,
+    stop_id,
+    routes,
+    ttl_secs=5 * 60,
+    stale_grace_secs=2 * 60,
+    memory_budget_per_route=256,
+    max_bytes_per_route=32 * 1024,
+):
+    def select(item, fetch_time):
+        route = item.get("lineName")
+        if route not in routes:
+            return None
+        if "timeToStation" in item:
+            # Relative to our own clock, so right even if the RTC is a little out
+            return route, fetch_time + int(item["timeToStation"])
+        if "expectedArrival" in item:
+            return route, datetime_utils.utc_iso_to_local_timestamp(item["expectedArrival"])
+        return None
+
+    def finish(values):
+        arrivals = {route: [] for route in routes}
+        for route, arrival_time in values:
+            arrivals[route].append(arrival_time)
+        return {TFL.bus_item_name(route): sorted(arrival_times) for route, arrival_times in arrivals.items()}
+
+    item_routes = {TFL.bus_item_name(route): route for route in routes}
+
+    def format_text(cache_item, arrival_times, now):
+        return TFL.next_buses_text(item_routes[cache_item], arrival_times, now)
+
+    # Over the memory budget, make room in the route with the most arrivals kept by dropping its latest one, unless
+    # that's the new arrival. So each route keeps its soonest buses, whatever order TFL lists them in.
+    def evict(values, value):
+        counts = {value[0]: 1}
+        for route, _ in values:
+            counts[route] = counts.get(route, 0) + 1
+        fullest = value[0]
+        for route, count in counts.items():
+            if count > counts[fullest]:
+                fullest = route
+
+        latest = None
+        for index, (route, arrival_time) in enumerate(values):
+            if route == fullest and (latest is None or arrival_time > values[latest][1]):
+                latest = index
+        if latest is None or (fullest == value[0] and value[1] >= values[latest][1]):
+            return None
+        return latest
+
+    return DataSource(
+        name,
+        tuple(TFL.bus_item_name(route) for route in routes),
+        TFL.arrivals_url(routes, stop_id),
+        ("lineName", "timeToStation", "expectedArrival"),
+        select,
+        finish,
+        ttl_secs,
+        stale_grace_secs,
+        memory_budget_per_route * len(routes),
+        max_bytes_per_route * len(routes),
+        format_text,
+        evict,
+    )
+
+
+# Status description of each of the tube lines, e.g. "Good Service". One request covers all the lines, so the
+# response cap is per line.
+def line_status_source(
+    name, line_ids, ttl_secs=5 * 60, stale_grace_secs=30 * 60, memory_budget=256, max_bytes_per_line=32 * 1024
+):
+    def select(item, fetch_time):
+        line_id = item.get("id")
+        if line_id not in line_ids or "statusSeverityDescription" not in item:
+            return None
+        return line_id, item["statusSeverityDescription"]
+
+    def finish(values):
+        if not values:
+            raise Exception("no line status found in response")
+        # A line missing from the response has no status, rather than keeping its last one as if it were fresh
+        statuses = {TFL.line_item_name(line_id): None for line_id in line_ids}
+        for line_id, description in values:
+            statuses[TFL.line_item_name(line_id)] = description
+        return statuses
+
+    item_lines = {TFL.line_item_name(line_id): line_id for line_id in line_ids}
+
+    def format_text(cache_item, description, now):
+        return TFL.line_status_text(item_lines[cache_item], description), None
+
+    return DataSource(
+        name,
+        tuple(TFL.line_item_name(line_id) for line_id in line_ids),
+        TFL.line_status_url(line_ids),
+        ("id", "statusSeverityDescription"),
+        select,
+        finish,
+        ttl_secs,
+        stale_grace_secs,
+        memory_budget,
+        max_bytes_per_line * len(line_ids),
+        format_text,
+    )
+
+
+# One text value from a JSON object, e.g. the custom message in the Gist. The cache item has the source's name.
+def json_text_source(
+    name, url, key, ttl_secs=60 * 60, stale_grace_secs=24 * 60 * 60, memory_budget=512, max_response_bytes=4 * 1024
+):
+    def select(item, fetch_time):
+        return item.get(key)
+
+    def finish(values):
+        return {name: first_value(values)}
+
+    return DataSource(
+        name, (name,), url, (key,), select, finish, ttl_secs, stale_grace_secs, memory_budget, max_response_bytes
+    )
+
+
+# The sources the panel shows. Built when the cache is made, so it picks up the settings in config at that time.
+def default_sources():
+    return (
+        json_text_source("custom_message", config.custom_message_gist_URL, "custom_message"),
+        line_status_source("tfl_line_status", config.TFL_TUBE_LINES),
+        bus_arrivals_source("tfl_arrivals", config.TFL_BUS_STOP_ID, config.TFL_BUS_ROUTES),
+    )
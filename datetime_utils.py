@@ -8,11 +8,12 @@ GitHub Repository: https://github.com/Pharkie/AdamGalactic/
 License: GNU General Public License (GPL)
 """
 import utime # type: ignore
-import ntptime # type: ignore
 import uasyncio
 import urandom  # type: ignore
 import config
 import utils
+import ntp_client
+import rtc_drift
 import machine # type: ignore
 
 def format_date(dt):
@@ -23,34 +24,57 @@ def format_date(dt):
     year = "{:04d}".format(dt[0])
     return f"{day} {month} {year}"
 
+# BST starts and ends at 01:00 UTC: 1am GMT on the last Sunday of March, and 2am BST on the last Sunday of October
+BST_TRANSITION_SECS = 3600
+
+# Year -> (BST start, BST end) as UTC timestamps, worked out the first time the year is needed
+bst_table = {}
+# The year last checked: (start of year, start of next year, BST start, BST end), so most checks are comparisons
+bst_current_year = None
+
 def last_sunday(year, month):
-    # Calculate the date of the last Sunday of the specified month and year.
-    # Find the date of the last Sunday in a given month
-    last_day = utime.mktime((year, month + 1, 1, 0, 0, 0, 0, 0)) - 86400  # Set to the last day of the previous month
-    weekday = utime.localtime(last_day)[6]  # Get the weekday for the last day
+    # Timestamp of midnight at the start of the last Sunday of the specified month and year
+    last_day = utime.mktime((year, month + 1, 1, 0, 0, 0, 0, 0)) - 86400  # Last day of the month
+    weekday = utime.localtime(last_day)[6]  # Monday is 0, Sunday is 6
 
-    while weekday != 6:  # Sunday has index 6
-        last_day -= 86400  # Subtract a day in seconds
-        weekday = (weekday - 1) % 7
-    return int(last_day)
+    # Step back to the Sunday
+    return int(last_day) - ((weekday + 1) % 7) * 86400
+
+def bst_transitions(year):
+    # Return (BST start, BST end) for the year as UTC timestamps, from the table
+    transitions = bst_table.get(year)
+    if transitions is None:
+        transitions = (last_sunday(year, 3) + BST_TRANSITION_SECS, last_sunday(year, 10) + BST_TRANSITION_SECS)
+        bst_table[year] = transitions
+    return transitions
 
 def is_DST(timestamp):
-    # Check if the current time is within BST (British Summer Time).
-    # Check if the given timestamp is in DST (BST) considering the 1 am transition
-    time_tuple = utime.localtime(timestamp)
-    dst_start = last_sunday(time_tuple[0], 3)  # Last Sunday of March
-    dst_end = last_sunday(time_tuple[0], 10)   # Last Sunday of October
-
-    # Check if the current time is within DST dates
-    if dst_start <= timestamp < dst_end:
-        # Check if it's after 1 am on the last Sunday of March and before 2 am on the last Sunday of October
-        if (time_tuple[1] == 3 and time_tuple[2] == (dst_start // 86400) + 1 and time_tuple[3] < 1) or (time_tuple[1] == 10 and time_tuple[2] == (dst_end // 86400) and time_tuple[3] < 2):
-            return False  # Not in DST during the 1 am transition
-        else:
-            return True   # In DST during other times
-    else:
-        return False
+    # Check if the given UTC timestamp is in DST (BST)
+    global bst_current_year
+
+    year_entry = bst_current_year
+    if year_entry is None or not year_entry[0] <= timestamp < year_entry[1]:
+        # A different year to last time, which is rare
+        year = utime.localtime(timestamp)[0]
+        year_entry = (
+            utime.mktime((year, 1, 1, 0, 0, 0, 0, 0)),
+            utime.mktime((year + 1, 1, 1, 0, 0, 0, 0, 0)),
+        ) + bst_transitions(year)
+        bst_current_year = year_entry
+
+    return year_entry[2] <= timestamp < year_entry[3]
     
+def utc_iso_to_local_timestamp(iso_text):
+    # Convert a UTC time like "2024-01-01T12:07:11Z" (as used by the TFL API) to a timestamp on the RTC's clock,
+    # which is set to UK local time
+    year, month, day = iso_text[0:4], iso_text[5:7], iso_text[8:10]
+    hour, minute, second = iso_text[11:13], iso_text[14:16], iso_text[17:19]
+    timestamp = utime.mktime((int(year), int(month), int(day), int(hour), int(minute), int(second), 0, 0))
+
+    if is_DST(timestamp):
+        timestamp += 3600
+    return timestamp
+
 def get_time_values(current_time_tuple=None):
     # Split a time into individual digits, defaulting to current, real time.
     if current_time_tuple is None:
@@ -73,39 +97,141 @@ def get_time_values(current_time_tuple=None):
         day_of_month, month_name, year,
     )
 
-def sync_rtc():
-    # Assuming Wifi is already connected, sync RTC to NTP, then add an hour if it's DST and update the RTC
-    # try:
-        if not utils.is_wifi_connected():
-            raise Exception("Wi-Fi is not connected")
+def set_rtc(timestamp):
+    # rtc.datetime() param is a different format of tuple to utime.localtime() so below converts it
+    time_tuple = utime.localtime(timestamp)
+    machine.RTC().datetime((time_tuple[0], time_tuple[1], time_tuple[2], time_tuple[6], time_tuple[3], time_tuple[4], time_tuple[5], 0))
+
+# Whether the RTC was last set to BST (True) or GMT (False). None until it's set.
+rtc_DST_flag = None
 
-        ntptime.settime()
+# Keeps the RTC's drift estimate across restarts of the sync task, e.g. by the show
+drift_estimator = rtc_drift.DriftEstimator()
 
-        # Work out if we're in DST and if so, add an hour to the RTC
-        current_timestamp = utime.time()
+def rtc_to_utc(rtc_timestamp):
+    # The UTC time an RTC reading stands for, going by whether the RTC was set to BST, not by whether it's BST now.
+    # So a BST change since the RTC was set doesn't look like an hour of drift.
+    rtc_DST = rtc_DST_flag if rtc_DST_flag is not None else is_DST(rtc_timestamp - 3600)
+    return rtc_timestamp - 3600 if rtc_DST else rtc_timestamp
 
-        is_DST_flag = is_DST(current_timestamp)
+async def sync_rtc():
+    # Assuming Wifi is already connected, sync RTC to NTP, then add an hour if it's DST and update the RTC.
+    # Records the sync with the drift estimator, which schedules the next one.
+    # Returns how far the RTC was behind NTP time in ms (negative if ahead), before it was set.
+    # Raises an exception if Wi-Fi is down or no server answers.
+    global rtc_DST_flag
 
-        if is_DST_flag:
-            current_timestamp += 3600
+    if not utils.is_wifi_connected():
+        raise Exception("Wi-Fi is not connected")
+
+    response = await ntp_client.best_response()
+
+    # Wait for the RTC to tick over, to measure its offset to within a poll rather than a second
+    rtc_timestamp = utime.time()
+    while utime.time() == rtc_timestamp:
+        await uasyncio.sleep_ms(config.NTP_POLL_MS)
+    rtc_timestamp = utime.time()
+    utc_secs, utc_ms = response.time_now()
+    # Compared in UTC, so it's only the drift
+    offset_ms = (utc_secs - rtc_to_utc(rtc_timestamp)) * 1000 + utc_ms
+
+    # The RTC holds whole seconds, so wait for the start of the next second to set it
+    _, utc_ms = response.time_now()
+    await uasyncio.sleep_ms(1000 - utc_ms)
+    utc_secs, utc_ms = response.time_now()
+    # Round, in case the sleep woke a little early
+    current_timestamp = utc_secs + (1 if utc_ms >= 500 else 0)
+
+    # Work out if we're in DST and if so, add an hour to the RTC
+    is_DST_flag = is_DST(current_timestamp)
+
+    if is_DST_flag:
+        current_timestamp += 3600
+
+    # print(f"current_timestamp: {current_timestamp} and as tuple: {utime.localtime(current_timestamp)}")
+    set_rtc(current_timestamp)
+    rtc_DST_flag = is_DST_flag
+    drift_estimator.record_sync(offset_ms, current_timestamp)
+    # A random offset, so panels don't all ask the NTP servers at once
+    drift_estimator.next_sync_time += urandom.randint(0, 59)
+    print(
+        f"RTC time set from NTP server {response.server} (round trip {response.rtt_ms} ms) with DST: {is_DST_flag}. "
+        f"It was {offset_ms} ms behind"
+    )
+    return offset_ms
+
+def next_DST_change():
+    # (RTC time, seconds to add to the RTC) for the next change between GMT and BST, or None if the RTC isn't set
+    if rtc_DST_flag is None:
+        return None
+
+    utc_now = rtc_to_utc(utime.time())
+    year = utime.localtime(utc_now)[0]
+    bst_start, bst_end = bst_transitions(year)
+    if rtc_DST_flag:
+        # Clocks go back at 2am BST
+        return bst_end + 3600, -3600
+    if utc_now >= bst_end:
+        bst_start = bst_transitions(year + 1)[0]
+    # Clocks go forward at 1am GMT
+    return bst_start, 3600
+
+async def wait_for_next_sync():
+    # Sleep until the next sync is due. Meanwhile, step the RTC by a second each time the drift estimate says it's
+    # out, and by an hour when BST starts or ends, as the next sync may be hours later.
+    global rtc_DST_flag
+
+    while True:
+        now = utime.time()
+        step_time = drift_estimator.next_step_time()
+        wake_time = drift_estimator.next_sync_time if step_time is None else step_time
+        DST_change = next_DST_change()
+        if DST_change is not None and DST_change[0] < wake_time:
+            wake_time = DST_change[0]
+            step_time = None
+        else:
+            DST_change = None
+        if wake_time > now:
+            await uasyncio.sleep(wake_time - now)
+
+        if DST_change is not None:
+            set_rtc(utime.time() + DST_change[1])
+            rtc_DST_flag = not rtc_DST_flag
+            # The sync is due at the same true time, which is an hour later or earlier on the RTC
+            drift_estimator.next_sync_time += DST_change[1]
+            print(f"RTC changed to {'BST' if rtc_DST_flag else 'GMT'}")
+            continue
+
+        if step_time is None:
+            return
+        step_secs = drift_estimator.step()
+        set_rtc(utime.time() + step_secs)
+        print(f"RTC stepped {step_secs:+d}s for drift. {drift_estimator.report(utime.time())}")
+
+def resolve_ntp_servers_if_due():
+    # Look up the NTP servers once the next sync is close enough for the lookups to last until it, so the sync finds
+    # them in the DNS cache rather than blocking on a lookup. Any quiet window in that time will do. Call in a quiet
+    # window.
+    next_sync_time = drift_estimator.next_sync_time
+    if next_sync_time is None:
+        return
+    secs_to_sync = max(0, next_sync_time - utime.time())
+    if secs_to_sync < config.DNS_CACHE_TTL_SECS:
+        # Only the lookups that would run out before the sync
+        ntp_client.resolve_servers(within_secs=secs_to_sync)
 
-        # print(f"current_timestamp: {current_timestamp} and as tuple: {utime.localtime(current_timestamp)}")
-        rtc = machine.RTC()
-        # rtc.datetime() param is a different format of tuple to utime.localtime() so below converts it
-        rtc.datetime((utime.localtime(current_timestamp)[0], utime.localtime(current_timestamp)[1], utime.localtime(current_timestamp)[2], utime.localtime(current_timestamp)[6], utime.localtime(current_timestamp)[3], utime.localtime(current_timestamp)[4], utime.localtime(current_timestamp)[5], 0))
-        print(f"RTC time set from NTP with DST: {is_DST_flag} ")
-    # except Exception as e:
-    #     print(f"Failed to set time: {e}")
-    #     pass
-    
 async def sync_rtc_periodically():
     while True:
+        # Wait for the sync that's already scheduled, e.g. by the sync at startup or before the task was restarted
+        if drift_estimator.next_sync_time is not None:
+            await wait_for_next_sync()
+
         # print("sync_ntp_periodically() called")
-        sync_rtc()
-        current_time = utime.localtime()
-         
-        # Calculate seconds until the top of the next hour, then add a random offset
-        next_sync_secs = 3600 - current_time[5] - (60 * current_time[4]) + urandom.randint(0, 59)
+        try:
+            await sync_rtc()
+        except Exception as e:
+            # Keep the task alive, and try again sooner
+            print(f"Failed to sync RTC: {e}")
+            drift_estimator.next_sync_time = utime.time() + config.NTP_RETRY_SECS
         
-        print(f"sync_ntp_periodically() complete. Next sync in (secs): {next_sync_secs} secs")
-        await uasyncio.sleep(next_sync_secs)  # Sleep for the calculated duration
\ No newline at end of file
+        print(f"sync_ntp_periodically() complete. RTC {drift_estimator.report(utime.time())}")
@@ -0,0 +1,54 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: frame_pacing.py
+Description: Frame scheduler that paces animations against utime.ticks_ms deadlines, so they hold a steady speed
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import utime  # type: ignore
+import uasyncio
+
+
+class FrameScheduler:
+    def __init__(self, fps):
+        self.frame_ms = 1000 // fps
+        self.next_deadline = None
+        # Counters accumulate over every animation paced by this scheduler
+        self.frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+
+    # Call just before drawing the first frame of an animation
+    def start(self):
+        self.next_deadline = utime.ticks_add(utime.ticks_ms(), self.frame_ms)
+
+    # Wait until the next frame is due. Returns how many frame periods have passed (1 when on time),
+    # so the caller can skip that many pixels to catch up when it falls behind.
+    async def wait_next_frame(self):
+        self.frames += 1
+        wait_ms = utime.ticks_diff(self.next_deadline, utime.ticks_ms())
+
+        if wait_ms >= 0:
+            frames_passed = 1
+            await uasyncio.sleep_ms(wait_ms)
+        else:
+            # Missed the deadline. Drop any whole frames we are behind, but always yield to the event loop
+            self.late_frames += 1
+            dropped = -wait_ms // self.frame_ms
+            self.dropped_frames += dropped
+            frames_passed = 1 + dropped
+            await uasyncio.sleep_ms(0)
+
+        # Deadlines are absolute, so time spent rendering or in other coroutines does not accumulate as drift
+        self.next_deadline = utime.ticks_add(self.next_deadline, frames_passed * self.frame_ms)
+
+        return frames_passed
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "dropped_frames": self.dropped_frames,
+        }
@@ -0,0 +1,235 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: frame_recorder.py
+Description: Recording stand-ins for config.gu and config.picoboard. Captures every panel update as a
+run-length encoded frame with a timestamp, written to a compact binary log that can be replayed and measured.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import struct
+import utime  # type: ignore
+
+# Galactic Unicorn panel size. Not taken from config, as config creates the board objects while it is imported.
+WIDTH = 53
+HEIGHT = 11
+
+# Log file layout, all little endian:
+#   header: b"AGFR", version (B), width (B), height (B)
+#   frame:  timestamp_ms since first frame (I), run count (H), then per run: length (B), red (B), green (B), blue (B)
+LOG_MAGIC = b"AGFR"
+LOG_VERSION = 1
+LOG_HEADER_FORMAT = "<4sBBB"
+FRAME_HEADER_FORMAT = "<IH"
+RUN_FORMAT = "<BBBB"
+MAX_RUN_LENGTH = 255
+
+# Placeholder font for the headless board: 5 pixel glyph, 1 pixel spacing. Not the real bitmap6 font,
+# but deterministic per character so frames change the way they would on the panel.
+HEADLESS_CHAR_ADVANCE = 6
+HEADLESS_SPACE_ADVANCE = 3
+
+
+def encode_frame(framebuffer, bytes_per_pixel):
+    # Run-length encode a framebuffer of 32 bit 0x00RRGGBB pixels as a list of (length, red, green, blue) runs
+    runs = []
+    run_colour = None
+    run_length = 0
+
+    for offset in range(0, WIDTH * HEIGHT * bytes_per_pixel, bytes_per_pixel):
+        colour = (framebuffer[offset + 2], framebuffer[offset + 1], framebuffer[offset])
+        if colour == run_colour and run_length < MAX_RUN_LENGTH:
+            run_length += 1
+        else:
+            if run_colour is not None:
+                runs.append((run_length,) + run_colour)
+            run_colour = colour
+            run_length = 1
+
+    runs.append((run_length,) + run_colour)
+    return runs
+
+
+# A 53x11 RGB888 framebuffer with the subset of the PicoGraphics API this project uses.
+# Subclasses bytearray so memoryview(config.picoboard) works exactly as it does on the panel.
+class HeadlessPicoGraphics(bytearray):
+    def __init__(self, display=None):
+        super().__init__(WIDTH * HEIGHT * 4)
+        self.width = WIDTH
+        self.height = HEIGHT
+        self.pen = 0
+        self.font = None
+        self.remove_clip()
+
+    def create_pen(self, r, g, b):
+        return (r << 16) | (g << 8) | b
+
+    def set_pen(self, pen):
+        self.pen = pen
+
+    def set_font(self, font):
+        self.font = font
+
+    def set_clip(self, x, y, w, h):
+        self.clip = (max(0, x), max(0, y), min(self.width, x + w), min(self.height, y + h))
+
+    def remove_clip(self):
+        self.clip = (0, 0, self.width, self.height)
+
+    def fill_span(self, x, y, length):
+        # Set a horizontal run of pixels to the current pen, inside the clip
+        if not self.clip[1] <= y < self.clip[3]:
+            return
+        pen_bytes = bytes((self.pen & 0xFF, (self.pen >> 8) & 0xFF, (self.pen >> 16) & 0xFF, 0))
+        for column in range(max(x, self.clip[0]), min(x + length, self.clip[2])):
+            offset = (y * self.width + column) * 4
+            self[offset : offset + 4] = pen_bytes
+
+    def pixel(self, x, y):
+        self.fill_span(x, y, 1)
+
+    def pixel_span(self, x, y, length):
+        self.fill_span(x, y, length)
+
+    def rectangle(self, x, y, w, h):
+        for row in range(y, y + h):
+            self.fill_span(x, row, w)
+
+    def clear(self):
+        for row in range(self.clip[1], self.clip[3]):
+            self.fill_span(self.clip[0], row, self.clip[2] - self.clip[0])
+
+    def measure_text(self, text, scale=1, spacing=1):
+        return sum(HEADLESS_SPACE_ADVANCE if char == " " else HEADLESS_CHAR_ADVANCE for char in text) * scale
+
+    def text(self, text, x1, y1, wordwrap=-1, scale=1, angle=0, spacing=1):
+        x = x1
+        for char in text:
+            if char != " ":
+                for column in range(HEADLESS_CHAR_ADVANCE - 1):
+                    # Rows 1 to 5 of the glyph, like a bitmap6 digit
+                    bits = ((ord(char) * (column + 3) * 2654435761) >> 7) & 0x3E
+                    for row in range(6):
+                        if bits & (1 << row):
+                            self.fill_span(x + column, y1 + row, 1)
+                x += HEADLESS_CHAR_ADVANCE
+            else:
+                x += HEADLESS_SPACE_ADVANCE
+
+
+# Stands in for the GalacticUnicorn object. Records each update() and passes calls through to a real
+# unicorn, if given one, so it can also record on the panel itself.
+class RecordingUnicorn:
+    def __init__(self, unicorn=None, log_path=None):
+        self.unicorn = unicorn
+        self.brightness = 0.5 if unicorn is None else unicorn.get_brightness()
+        self.frame_count = 0
+        self.first_frame_ms = None
+        self.last_frame_ms = None
+        self.log_file = None
+
+        if log_path is not None:
+            self.log_file = open(log_path, "wb")
+            self.log_file.write(struct.pack(LOG_HEADER_FORMAT, LOG_MAGIC, LOG_VERSION, WIDTH, HEIGHT))
+
+    def update(self, graphics):
+        now_ms = utime.ticks_ms()
+        if self.first_frame_ms is None:
+            self.first_frame_ms = now_ms
+        self.last_frame_ms = now_ms
+        self.frame_count += 1
+
+        if self.log_file is not None:
+            framebuffer = memoryview(graphics)
+            runs = encode_frame(framebuffer, len(framebuffer) // (WIDTH * HEIGHT))
+            self.log_file.write(struct.pack(FRAME_HEADER_FORMAT, utime.ticks_diff(now_ms, self.first_frame_ms), len(runs)))
+            for run in runs:
+                self.log_file.write(struct.pack(RUN_FORMAT, *run))
+
+        if self.unicorn is not None:
+            self.unicorn.update(graphics)
+
+    def get_brightness(self):
+        return self.brightness
+
+    def set_brightness(self, brightness):
+        self.brightness = max(0.0, min(1.0, brightness))
+        if self.unicorn is not None:
+            self.unicorn.set_brightness(brightness)
+
+    def adjust_brightness(self, delta):
+        self.set_brightness(self.brightness + delta)
+
+    def is_pressed(self, switch):
+        return self.unicorn is not None and self.unicorn.is_pressed(switch)
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+# Swap config.gu for a recorder wrapping it. Returns the recorder; call close() on it when done.
+def install_recorder(log_path):
+    # Imported here, as host_shims imports this module to build its picographics stand-in, before config can be
+    # imported
+    import config
+
+    recorder = RecordingUnicorn(config.gu, log_path)
+    config.gu = recorder
+    return recorder
+
+
+def read_frame_log(log_path):
+    # Yield (timestamp_ms, pixels) for each frame in a log, where pixels is a bytearray of R, G, B per pixel
+    with open(log_path, "rb") as log_file:
+        magic, version, width, height = struct.unpack(LOG_HEADER_FORMAT, log_file.read(struct.calcsize(LOG_HEADER_FORMAT)))
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise Exception("not a frame log, or an unsupported version")
+
+        frame_header_size = struct.calcsize(FRAME_HEADER_FORMAT)
+        run_size = struct.calcsize(RUN_FORMAT)
+
+        while True:
+            frame_header = log_file.read(frame_header_size)
+            if len(frame_header) < frame_header_size:
+                break
+            timestamp_ms, run_count = struct.unpack(FRAME_HEADER_FORMAT, frame_header)
+
+            pixels = bytearray()
+            for _ in range(run_count):
+                run_length, red, green, blue = struct.unpack(RUN_FORMAT, log_file.read(run_size))
+                pixels.extend(bytes((red, green, blue)) * run_length)
+
+            if len(pixels) != width * height * 3:
+                raise Exception("corrupt frame in log")
+
+            yield timestamp_ms, pixels
+
+
+def summarise_frame_log(log_path):
+    # Frame count and frame intervals of a log, for comparing animations between versions
+    frame_count = 0
+    changed_frames = 0
+    intervals = []
+    last_timestamp = None
+    last_pixels = None
+
+    for timestamp_ms, pixels in read_frame_log(log_path):
+        frame_count += 1
+        if pixels != last_pixels:
+            changed_frames += 1
+        if last_timestamp is not None:
+            intervals.append(timestamp_ms - last_timestamp)
+        last_timestamp = timestamp_ms
+        last_pixels = pixels
+
+    return {
+        "frames": frame_count,
+        "changed_frames": changed_frames,
+        "duration_ms": last_timestamp or 0,
+        "min_interval_ms": min(intervals) if intervals else 0,
+        "avg_interval_ms": sum(intervals) / len(intervals) if intervals else 0,
+        "max_interval_ms": max(intervals) if intervals else 0,
+    }
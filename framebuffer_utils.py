@@ -0,0 +1,79 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: framebuffer_utils.py
+Description: Utils that read back the PicoGraphics framebuffer and blit pre-rendered 1-bit bitmaps onto it
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import config
+
+
+def get_framebuffer():
+    # PicoGraphics exposes its framebuffer through the buffer protocol
+    return memoryview(config.picoboard)
+
+
+def get_bytes_per_pixel(framebuffer):
+    return len(framebuffer) // (config.DISPLAY_WIDTH * config.DISPLAY_HEIGHT)
+
+
+def read_column_bits(framebuffer, x_pos, bytes_per_pixel):
+    # Return the lit pixels of one framebuffer column as a bitmask, bit 0 being the top row
+    bits = 0
+    offset = x_pos * bytes_per_pixel
+    row_stride = config.DISPLAY_WIDTH * bytes_per_pixel
+
+    for y in range(config.DISPLAY_HEIGHT):
+        for b in range(bytes_per_pixel):
+            if framebuffer[offset + b]:
+                bits |= 1 << y
+                break
+        offset += row_stride
+
+    return bits
+
+
+def render_scroll_strip(msg_text, y_pos=2, strip_width=None):
+    # Render msg_text once into an off-screen 1-bit strip, 2 bytes per column (bit 0 = top row).
+    # Uses the framebuffer as a scratch area, 53 columns at a time, so call it before drawing the next frame.
+    if strip_width is None:
+        strip_width = config.picoboard.measure_text(msg_text, 1)
+    strip = bytearray(2 * strip_width)
+
+    framebuffer = get_framebuffer()
+    bytes_per_pixel = get_bytes_per_pixel(framebuffer)
+
+    for start in range(0, strip_width, config.DISPLAY_WIDTH):
+        config.picoboard.set_pen(config.PEN_BLACK)
+        config.picoboard.clear()
+        config.picoboard.set_pen(config.PEN_YELLOW)
+        config.picoboard.text(text=msg_text, x1=-start, y1=y_pos, wordwrap=-1, scale=1)
+
+        for x in range(min(config.DISPLAY_WIDTH, strip_width - start)):
+            bits = read_column_bits(framebuffer, x, bytes_per_pixel)
+            strip[2 * (start + x)] = bits & 0xFF
+            strip[2 * (start + x) + 1] = bits >> 8
+
+    return strip
+
+
+def draw_scroll_strip(strip, x_pos, pen_colour):
+    # Draw the visible 53 column window of a strip, with the first strip column at x_pos.
+    # Cost depends on the display width, not on the length of the message.
+    config.picoboard.set_pen(config.PEN_BLACK)
+    config.picoboard.clear()
+    config.picoboard.set_pen(pen_colour)
+
+    first_column = max(0, -x_pos)
+    last_column = min(len(strip) // 2, config.DISPLAY_WIDTH - x_pos)
+
+    for column in range(first_column, last_column):
+        bits = strip[2 * column] | (strip[2 * column + 1] << 8)
+        y = 0
+        while bits:
+            if bits & 1:
+                config.picoboard.pixel(x_pos + column, y)
+            bits >>= 1
+            y += 1
@@ -0,0 +1,252 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: json_stream.py
+Description: Incremental JSON scanner that picks out a few keys from each element of a JSON array (or from a single
+JSON object) as the bytes arrive, without building the whole document in memory
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+
+QUOTE = 0x22  # "
+BACKSLASH = 0x5C  # \
+COMMA = 0x2C  # ,
+COLON = 0x3A  # :
+OPEN_OBJECT = 0x7B  # {
+CLOSE_OBJECT = 0x7D  # }
+OPEN_ARRAY = 0x5B  # [
+CLOSE_ARRAY = 0x5D  # ]
+WHITESPACE = b" \t\r\n"
+
+ESCAPES = {
+    ord("n"): 0x0A,
+    ord("t"): 0x09,
+    ord("r"): 0x0D,
+    ord("b"): 0x08,
+    ord("f"): 0x0C,
+}
+
+# U+FFFD, put in place of half a surrogate pair
+REPLACEMENT_CHARACTER = 0xFFFD
+
+
+# Class to represent the JSON key scanner object.
+# Feed it the document in chunks of any size. For each element of a top level array (or for a top level object),
+# on_item is called with a dict of the first scalar value found for each requested key, at any depth in that element.
+class JSONKeyScanner:
+    def __init__(self, keys, on_item, max_value_length=256, max_depth=16):
+        self.keys = tuple(key.encode() for key in keys)
+
+        # Preallocated so scanning doesn't allocate per token
+        self.token = bytearray(max(max_value_length, max(len(key) for key in self.keys) + 1))
+        self.containers = bytearray(max_depth)
+
+        self.reset(on_item)
+
+    # Get ready to scan a new document, reusing the buffers
+    def reset(self, on_item):
+        self.on_item = on_item
+        self.token_length = 0
+        self.depth = 0
+
+        # Depth at which an item's container is open: 2 inside a top level array, 1 for a top level object
+        self.item_depth = None
+        self.item = None
+
+        self.in_string = False
+        self.string_is_key = False
+        self.escape = False
+        self.unicode_digits = None
+        # A \u escape for the high half of a surrogate pair (e.g. an emoji), waiting for the low half
+        self.high_surrogate = None
+        self.in_literal = False
+        self.expect_key = False
+        self.capture_key = None
+
+    def feed(self, chunk):
+        for byte in chunk:
+            if self.in_string:
+                self.scan_string_byte(byte)
+                continue
+
+            if self.in_literal:
+                if byte not in WHITESPACE and byte not in b",}]":
+                    self.append_token(byte)
+                    continue
+                self.in_literal = False
+                self.end_literal()
+
+            if byte in WHITESPACE or byte == COLON:
+                continue
+
+            if byte == QUOTE:
+                self.in_string = True
+                self.string_is_key = self.expect_key
+                self.expect_key = False
+                self.token_length = 0
+            elif byte == OPEN_OBJECT or byte == OPEN_ARRAY:
+                self.open_container(byte)
+            elif byte == CLOSE_OBJECT or byte == CLOSE_ARRAY:
+                self.close_container()
+            elif byte == COMMA:
+                self.expect_key = self.depth > 0 and self.containers[self.depth - 1] == OPEN_OBJECT
+            else:
+                # Start of a number, true, false or null
+                self.in_literal = True
+                self.token_length = 0
+                self.append_token(byte)
+
+    # Call after the last chunk, in case the document is a bare value with no closing bracket
+    def close(self):
+        if self.in_literal:
+            self.in_literal = False
+            self.end_literal()
+
+    def scan_string_byte(self, byte):
+        if self.unicode_digits is not None:
+            self.unicode_digits.append(byte)
+            if len(self.unicode_digits) == 4:
+                self.end_unicode_escape(int(self.unicode_digits, 16))
+                self.unicode_digits = None
+            return
+
+        # Anything but another \u escape means the high surrogate has no low half
+        if self.high_surrogate is not None and not (byte == BACKSLASH and not self.escape) and not (
+            self.escape and byte == ord("u")
+        ):
+            self.flush_high_surrogate()
+
+        if self.escape:
+            self.escape = False
+            if byte == ord("u"):
+                self.unicode_digits = bytearray()
+            else:
+                self.append_token(ESCAPES.get(byte, byte))
+        elif byte == BACKSLASH:
+            self.escape = True
+        elif byte == QUOTE:
+            self.in_string = False
+            self.end_string()
+        else:
+            self.append_token(byte)
+
+    # Add the character of a \u escape to the token as UTF-8, joining the two halves of a surrogate pair into one
+    # character first
+    def end_unicode_escape(self, code):
+        if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+            code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self.high_surrogate = None
+        self.flush_high_surrogate()
+
+        if 0xD800 <= code < 0xDC00:
+            self.high_surrogate = code
+            return
+        if 0xDC00 <= code < 0xE000:
+            # A low surrogate with no high half
+            code = REPLACEMENT_CHARACTER
+        for utf8_byte in chr(code).encode():
+            self.append_token(utf8_byte)
+
+    # A high surrogate with no low half can't be encoded, so it's replaced
+    def flush_high_surrogate(self):
+        if self.high_surrogate is not None:
+            self.high_surrogate = None
+            for utf8_byte in chr(REPLACEMENT_CHARACTER).encode():
+                self.append_token(utf8_byte)
+
+    def append_token(self, byte):
+        # Only keys and the values of requested keys are kept. Anything too long is truncated.
+        if (self.string_is_key or self.capture_key is not None or self.in_literal) and self.token_length < len(self.token):
+            self.token[self.token_length] = byte
+            self.token_length += 1
+
+    def open_container(self, byte):
+        if self.depth >= len(self.containers):
+            raise ValueError("JSON nested too deeply")
+
+        if self.depth == 0:
+            self.item_depth = 2 if byte == OPEN_ARRAY else 1
+
+        self.containers[self.depth] = byte
+        self.depth += 1
+
+        if self.depth == self.item_depth:
+            self.item = {}
+
+        # A requested key with an object or array value isn't a scalar, so keep looking
+        self.capture_key = None
+        self.expect_key = byte == OPEN_OBJECT
+
+    def close_container(self):
+        if self.depth == 0:
+            raise ValueError("unbalanced JSON")
+
+        if self.depth == self.item_depth and self.item is not None:
+            item = self.item
+            self.item = None
+            self.on_item(item)
+
+        self.depth -= 1
+        self.expect_key = False
+
+    def end_string(self):
+        if self.string_is_key:
+            self.string_is_key = False
+            self.capture_key = None
+            if self.item is not None:
+                key = bytes(self.token[: self.token_length])
+                if key in self.keys and key.decode() not in self.item:
+                    self.capture_key = key.decode()
+        elif self.capture_key is not None:
+            self.item[self.capture_key] = bytes(self.token[: self.token_length]).decode()
+            self.capture_key = None
+
+    def end_literal(self):
+        if self.capture_key is None:
+            return
+
+        text = bytes(self.token[: self.token_length]).decode()
+        if text == "true":
+            value = True
+        elif text == "false":
+            value = False
+        elif text == "null":
+            value = None
+        elif "." in text or "e" in text or "E" in text:
+            value = float(text)
+        else:
+            value = int(text)
+
+        self.item[self.capture_key] = value
+        self.capture_key = None
+
+
+def scan_stream(stream, keys, on_item, chunk_size=512):
+    # Read a stream (e.g. a socket) in chunks and pass the requested keys of each item to on_item
+    scanner = JSONKeyScanner(keys, on_item)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        scanner.feed(chunk)
+    scanner.close()
+
+
+async def scan_response(response, scanner, buffer, max_response_bytes=None):
+    # Read an async_http response into buffer, a preallocated bytearray, and scan each part in place with scanner.
+    # Don't share the buffer between concurrent fetches: reading a part can await after filling the buffer, e.g. for
+    # the CRLF after a chunk, so another fetch could overwrite it before it is scanned.
+    view = memoryview(buffer)
+    total_bytes = 0
+    while True:
+        count = await response.readinto(view)
+        if not count:
+            break
+
+        total_bytes += count
+        if max_response_bytes is not None and total_bytes > max_response_bytes:
+            raise ValueError(f"response over {max_response_bytes} bytes")
+
+        scanner.feed(view[:count] if count < len(view) else view)
+    scanner.close()
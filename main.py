@@ -10,6 +10,7 @@ License: GNU General Public License (GPL)
 
 # Micropython libs
 import urandom  # type: ignore
+import utime  # type: ignore
 import TFL
 import uasyncio
 import sys
@@ -20,38 +21,41 @@ import datetime_utils
 import temp_etc_utils
 import panel_attract_functions
 import panel_liveshow
+import rolling_clock_display_utils
 import utils
 import cache_online_data
+import task_profiler
 
 
-async def show_temp_and_update_next_buses_cache():
-    if config.BME_ENABLED:
+async def show_static_and_refresh_cache(show_coro_fn):
+    # Static displays are the quiet windows to run any cache refreshes that are due,
+    # unless refreshes run in a background task
+    if config.REFRESH_IN_BACKGROUND:
+        if config.BME_ENABLED:
+            await show_coro_fn()
+    elif config.BME_ENABLED:
         await uasyncio.gather(
-            temp_etc_utils.show_temp_coro(),
-            config.my_cache.update_next_buses_cache(),
+            show_coro_fn(),
+            config.my_refresh_scheduler.run_quiet_window(),
         )
     else:
-        await config.my_cache.update_next_buses_cache()
+        await config.my_refresh_scheduler.run_quiet_window()
 
 
-async def show_humidity_and_update_line_status_cache():
-    if config.BME_ENABLED:
-        await uasyncio.gather(
-            temp_etc_utils.show_humidity_coro(),
-            config.my_cache.update_line_status_cache(),
-        )
-    else:
-        await config.my_cache.update_line_status_cache()
+async def show_temp_and_refresh_cache():
+    await show_static_and_refresh_cache(temp_etc_utils.show_temp_coro)
 
 
-async def show_pressure_and_update_custom_message_cache():
-    if config.BME_ENABLED:
-        await uasyncio.gather(
-            temp_etc_utils.show_pressure_coro(),
-            config.my_cache.update_custom_message_cache(),
-        )
-    else:
-        await config.my_cache.update_custom_message_cache()
+async def show_humidity_and_refresh_cache():
+    await show_static_and_refresh_cache(temp_etc_utils.show_humidity_coro)
+
+
+async def show_pressure_and_refresh_cache():
+    await show_static_and_refresh_cache(temp_etc_utils.show_pressure_coro)
+
+
+async def show_gas_and_refresh_cache():
+    await show_static_and_refresh_cache(temp_etc_utils.show_gas_coro)
 
 
 async def run_attract_mode():
@@ -60,19 +64,39 @@ async def run_attract_mode():
     global my_cache
 
     # List of tasks to be run, each represented by a tuple with a function to call and a timeout value.
-    # Updates different parts of the cache in the background while displaying some of the static messages.
+    # The static messages double as quiet windows to refresh the cache in the background.
     # Params: (function name, timeout_secs)
     attract_tasks = [
         (TFL.scroll_next_bus_info, None),
-        (TFL.scroll_piccadilly_line_status, None),
+        (TFL.scroll_tube_line_status, None),
         (utils.scroll_configured_message, None),
         (panel_attract_functions.rolling_clock, config.CHANGE_INTERVAL),
-        (show_temp_and_update_next_buses_cache, config.CHANGE_INTERVAL),
-        (show_humidity_and_update_line_status_cache, config.CHANGE_INTERVAL),
-        (show_pressure_and_update_custom_message_cache, config.CHANGE_INTERVAL),
-        (temp_etc_utils.show_gas_coro, config.CHANGE_INTERVAL),
+        (show_temp_and_refresh_cache, config.CHANGE_INTERVAL),
+        (show_humidity_and_refresh_cache, config.CHANGE_INTERVAL),
+        (show_pressure_and_refresh_cache, config.CHANGE_INTERVAL),
+        (show_gas_and_refresh_cache, config.CHANGE_INTERVAL),
     ]
 
+    # Optional profiling of each task, with a probe that measures how long tasks hold the event loop
+    profiler = None
+    if config.PROFILE_ATTRACT_TASKS:
+        profiler = task_profiler.TaskProfiler(config.PROFILE_MAX_TASKS)
+        lag_monitor_task = uasyncio.create_task(profiler.monitor_loop_lag())
+
+    refresh_task = None
+    if config.REFRESH_IN_BACKGROUND:
+        refresh_task = uasyncio.create_task(config.my_refresh_scheduler.run_background())
+
+    try:
+        await run_attract_tasks(attract_tasks, profiler)
+    finally:
+        if profiler is not None:
+            lag_monitor_task.cancel()
+        if refresh_task is not None:
+            refresh_task.cancel()
+
+
+async def run_attract_tasks(attract_tasks, profiler):
     # last_index to ensure that the first task of the current loop is not the same as the last task of the previous loop i.e. runs twice in a row
     last_index = None
     while True:
@@ -102,23 +126,36 @@ async def run_attract_mode():
             # else:
             #     print(f"Running {task_fn.__name__} for up to {timeout_secs} seconds")
 
+            if profiler is not None:
+                profiler.start_task()
+
+            timed_out = False
             try:
                 await uasyncio.wait_for(
                     task_fn() if timeout_secs is None else task_fn(),
                     timeout=timeout_secs,
                 )
             except uasyncio.TimeoutError:
-                pass
+                timed_out = True
+
+            if profiler is not None:
+                profiler.end_task(task_fn.__name__, timed_out)
 
             # print(f"Completed task {current_task_name}")
 
-            config.picoboard.set_pen(config.PEN_BLACK)
-            config.picoboard.clear()
-            config.gu.update(config.picoboard)
+            utils.clear_picoboard()
 
         # Store the last index for the next loop
         last_index = indices[-1]
 
+        if profiler is not None:
+            profiler.print_report()
+            config.my_refresh_scheduler.print_report()
+            config.my_cache.http_pool.print_report()
+            config.my_cache.print_memory_report()
+            config.my_cache.print_circuit_report()
+            print(f"RTC: {datetime_utils.drift_estimator.report(utime.time())}")
+
         # await uasyncio.sleep(5) # Debugging
 
 
@@ -158,12 +195,12 @@ async def listen_for_commands():
     while True:
         if config.gu.is_pressed(config.GalacticUnicorn.SWITCH_BRIGHTNESS_UP):
             config.gu.adjust_brightness(+0.01)
-            config.gu.update(config.picoboard)
+            utils.update_display()
             await uasyncio.sleep(0.01)
 
         if config.gu.is_pressed(config.GalacticUnicorn.SWITCH_BRIGHTNESS_DOWN):
             config.gu.adjust_brightness(-0.01)
-            config.gu.update(config.picoboard)
+            utils.update_display()
             await uasyncio.sleep(0.01)
 
         # Waits for a command and blocks the rest of this function, so need for sleep in this loop
@@ -180,9 +217,17 @@ async def listen_for_commands():
 
 if __name__ == "__main__":
     print("Start program")
+    # Pre-render the rolling clock animation at startup, so the first roll doesn't stall while it's built
+    rolling_clock_display_utils.build_digit_roll_sprites()
     utils.show_static_message("PenClock", config.PEN_BLUE, 0.2)
 
     utils.connect_wifi()
+    # Set the clock before loading the cache snapshot, so its expiry times can be checked.
+    # The sync is recorded for the drift estimate, and the sync task waits for the next one it schedules.
+    try:
+        uasyncio.run(datetime_utils.sync_rtc())
+    except Exception as e:
+        print(f"Failed to set time at startup: {e}")
     # Update the online data cache at startup
     uasyncio.run(cache_online_data.main())
 
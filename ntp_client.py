@@ -0,0 +1,159 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: ntp_client.py
+Description: A uasyncio SNTP client. Asks several NTP servers at once over UDP and keeps the answer with the shortest
+round trip, corrected for half the round trip. Waits for the answers without blocking, so the display keeps running,
+and a server that doesn't answer only costs its timeout. Server addresses come from the DNS cache shared with
+async_http, filled in a quiet window ahead of each sync by resolve_servers().
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import errno
+import socket
+import struct
+import utime  # type: ignore
+import urandom  # type: ignore
+import uasyncio
+import config
+import async_http
+
+NTP_PORT = 123
+NTP_PACKET_SIZE = 48
+# Seconds from the NTP epoch (1900) to the utime epoch, which is 1970 on most ports but 2000 on some
+NTP_DELTA = 2208988800 if utime.gmtime(0)[0] == 1970 else 3155673600
+
+
+# Class to represent one server's answer. Holds whole seconds and milliseconds, as MicroPython floats are too
+# coarse for a timestamp.
+class NTPResponse:
+    def __init__(self, server, utc_secs, utc_ms, rtt_ms, received_ticks):
+        self.server = server
+        # UTC time when the answer arrived: the server's transmit time plus half the round trip
+        self.utc_secs = utc_secs
+        self.utc_ms = utc_ms
+        # Round trip less the time the server took to reply
+        self.rtt_ms = rtt_ms
+        self.received_ticks = received_ticks
+
+    # UTC time now as (seconds, milliseconds), counted on from the answer with the ticks timer
+    def time_now(self):
+        total_ms = self.utc_ms + utime.ticks_diff(utime.ticks_ms(), self.received_ticks)
+        return self.utc_secs + total_ms // 1000, total_ms % 1000
+
+
+# Split "host" or "host:port" into (host, port)
+def parse_server(server):
+    host, _, port = server.partition(":")
+    return host, int(port) if port else NTP_PORT
+
+
+# Look up the servers that aren't in the DNS cache, or will drop out of it within within_secs. Blocks, so call in a
+# quiet window. Defaults to the servers in config.
+def resolve_servers(servers=None, within_secs=0):
+    async_http.dns_cache.refresh([parse_server(server) for server in servers or config.NTP_SERVERS], within_secs)
+
+
+# A server's IPv4 address from the DNS cache. If it isn't there (e.g. the first sync at startup, before any quiet
+# window), falls back to a lookup that blocks.
+def resolve(host, port):
+    address = async_http.dns_cache.get(host)
+    if address is None:
+        print(f"NTP server {host} not in the DNS cache, looking it up now")
+        address = async_http.dns_cache.resolve(host, port)
+    return address
+
+
+def make_request(nonce):
+    # LI 0, version 4, mode 3 (client). The nonce goes in the transmit timestamp, and the server echoes it back.
+    request = bytearray(NTP_PACKET_SIZE)
+    request[0] = 0x23
+    struct.pack_into("!II", request, 40, nonce >> 32, nonce & 0xFFFFFFFF)
+    return request
+
+
+# Milliseconds in the fraction part of an NTP timestamp
+def fraction_ms(fraction):
+    return (fraction * 1000) >> 32
+
+
+# Parse a server's packet into an NTPResponse, or None if it isn't a usable answer to our request
+def parse_response(server, packet, nonce, sent_ticks, received_ticks):
+    if len(packet) < NTP_PACKET_SIZE:
+        return None
+
+    leap, mode, stratum = packet[0] >> 6, packet[0] & 0x07, packet[1]
+    originate_secs, originate_fraction, receive_secs, receive_fraction, transmit_secs, transmit_fraction = (
+        struct.unpack("!IIIIII", packet[24:48])
+    )
+    # Mode 4 is a server reply. Leap indicator 3 or stratum 0 (a kiss of death) means the server isn't synchronised.
+    if mode != 4 or leap == 3 or not 1 <= stratum <= 15:
+        return None
+    # An answer to some other request, e.g. a late reply to an earlier one
+    if (originate_secs << 32) | originate_fraction != nonce:
+        return None
+
+    server_ms = (transmit_secs - receive_secs) * 1000 + fraction_ms(transmit_fraction) - fraction_ms(receive_fraction)
+    rtt_ms = max(0, utime.ticks_diff(received_ticks, sent_ticks) - server_ms)
+
+    utc_ms = fraction_ms(transmit_fraction) + rtt_ms // 2
+    return NTPResponse(server, transmit_secs - NTP_DELTA + utc_ms // 1000, utc_ms % 1000, rtt_ms, received_ticks)
+
+
+# Ask one server the time. Raises OSError if it doesn't answer within timeout_ms.
+async def query(server, timeout_ms=config.NTP_TIMEOUT_MS):
+    host, port = parse_server(server)
+    address = resolve(host, port)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        nonce = (urandom.getrandbits(32) << 32) | urandom.getrandbits(32)
+        sent_ticks = utime.ticks_ms()
+        sock.sendto(make_request(nonce), (address, port) if isinstance(address, str) else address)
+
+        while True:
+            try:
+                packet = sock.recv(NTP_PACKET_SIZE)
+                response = parse_response(server, packet, nonce, sent_ticks, utime.ticks_ms())
+                if response is not None:
+                    return response
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+
+            if utime.ticks_diff(utime.ticks_ms(), sent_ticks) >= timeout_ms:
+                raise OSError(errno.ETIMEDOUT)
+            # Poll, letting the display run in between
+            await uasyncio.sleep_ms(config.NTP_POLL_MS)
+    finally:
+        sock.close()
+
+
+async def try_query(server, timeout_ms):
+    try:
+        return await query(server, timeout_ms)
+    except Exception as e:
+        print(f"NTP server {server} failed: {e}")
+        return None
+
+
+# Ask all the servers at once, and return the answer with the shortest round trip. Raises OSError if none answer.
+# Defaults to the servers and timeout in config.
+async def best_response(servers=None, timeout_ms=None):
+    if servers is None:
+        servers = config.NTP_SERVERS
+    if timeout_ms is None:
+        timeout_ms = config.NTP_TIMEOUT_MS
+
+    responses = await uasyncio.gather(*[try_query(server, timeout_ms) for server in servers])
+
+    best = None
+    for response in responses:
+        if response is not None and (best is None or response.rtt_ms < best.rtt_ms):
+            best = response
+
+    if best is None:
+        raise OSError("no NTP server answered")
+    return best
@@ -12,35 +12,55 @@ import utime # type: ignore
 import config
 import datetime_utils
 import rolling_clock_display_utils
+import utils
+
+# Render time of the rolling clock ticks drawn by update_clock_display_async(), excluding the animation delays
+clock_render_stats = {"ticks": 0, "last_us": 0, "max_us": 0, "total_us": 0}
+
+def draw_clock_row(new_values, old_values, tick_flags, row, reverse):
+    # Draw one of the 6 animation rows of a clock tick and push it to the panel
+    for j in range(6):
+        if tick_flags[j]: # Scroll that digit one row, blitted from the pre-rendered sprite table
+            rolling_clock_display_utils.blit_digit_roll(old_values[j], new_values[j], config.clock_digits_x[j], config.clock_digit_all_y, row, reverse)
+        else:
+            rolling_clock_display_utils.show_digit(old_values[j], config.clock_digits_x[j], config.clock_digit_all_y)
+
+    pen_colour = config.PEN_YELLOW if new_values[5] % 2 == 0 else config.PEN_BLACK
+    config.picoboard.set_pen(pen_colour)
+    config.picoboard.text(text = ":", x1 = config.base_x + (2 * config.char_width), y1 = config.clock_digit_all_y, wordwrap = -1, scale = 1)
+    config.picoboard.text(text = ":", x1 = config.base_x + (4 * config.char_width) + 3, y1 = config.clock_digit_all_y, wordwrap = -1, scale = 1)
+
+    # Skipped if this animation row left the frame unchanged
+    utils.update_display()
 
 def update_clock_display(new_values, old_values, delay = 0.05, reverse = False):
+    # Blocking version: holds the event loop for the whole tick. Prefer update_clock_display_async() inside uasyncio.
     tick_flags = [new_values[i] != old_values[i] for i in range(6)]
 
     for i in range(6):
-        for j in range(6):
-            if tick_flags[j]: # Scroll that digit one row
-                # Define digit parameters as a dictionary
-                scroll_digit_params = {
-                    'reverse': reverse,                     # Reverse flag (True or False)  
-                    'old_number': old_values[j],            # Top number to display  
-                    'new_number': new_values[j],             # Bottom number to display 
-                    'x_pos': config.clock_digits_x[j],      # X position 
-                    'y_pos': config.clock_digit_all_y,      # Y position 
-                    'loop_num': i                           # Loop number  
-                }
-                rolling_clock_display_utils.scroll_digit(scroll_digit_params)
-            else:
-                rolling_clock_display_utils.show_digit(old_values[j], config.clock_digits_x[j], config.clock_digit_all_y)
-
-        pen_colour = config.PEN_YELLOW if new_values[5] % 2 == 0 else config.PEN_BLACK
-        config.picoboard.set_pen(pen_colour)
-        config.picoboard.text(text = ":", x1 = config.base_x + (2 * config.char_width), y1 = config.clock_digit_all_y, wordwrap = -1, scale = 1)
-        config.picoboard.text(text = ":", x1 = config.base_x + (4 * config.char_width) + 3, y1 = config.clock_digit_all_y, wordwrap = -1, scale = 1)
-
-        config.gu.update(config.picoboard)
-
+        draw_clock_row(new_values, old_values, tick_flags, i, reverse)
         utime.sleep(delay)
 
+async def update_clock_display_async(new_values, old_values, delay = 0.05, reverse = False):
+    # Same visuals as update_clock_display(), but yields to other coroutines between animation rows.
+    # Returns the time spent rendering this tick in microseconds.
+    tick_flags = [new_values[i] != old_values[i] for i in range(6)]
+    render_us = 0
+
+    for i in range(6):
+        row_start = utime.ticks_us()
+        draw_clock_row(new_values, old_values, tick_flags, i, reverse)
+        render_us += utime.ticks_diff(utime.ticks_us(), row_start)
+
+        await uasyncio.sleep(delay)
+
+    clock_render_stats["ticks"] += 1
+    clock_render_stats["last_us"] = render_us
+    clock_render_stats["max_us"] = max(clock_render_stats["max_us"], render_us)
+    clock_render_stats["total_us"] += render_us
+
+    return render_us
+
 async def rolling_clock(for_seconds=None):
     # print("rolling_clock() called")
     old_values = datetime_utils.get_time_values()
@@ -59,7 +79,7 @@ async def rolling_clock(for_seconds=None):
 
         new_values = list(datetime_utils.get_time_values())
 
-        update_clock_display(new_values, old_values, delay = 0.05, reverse=False)
+        await update_clock_display_async(new_values, old_values, delay = 0.05, reverse=False)
 
         end_time = utime.ticks_ms()
         cycle_duration = utime.ticks_diff(end_time, start_time)
@@ -29,7 +29,7 @@ async def advance_clock_slowly(old_values):
 
         delayed_delay = 0.05 * pow(2, i)
 
-        panel_attract_functions.update_clock_display(new_values, old_values, delay=delayed_delay, reverse=False)
+        await panel_attract_functions.update_clock_display_async(new_values, old_values, delay=delayed_delay, reverse=False)
 
         # Exponential acceleration
         sleep_duration = 1 * pow(1.25, i)
@@ -65,7 +65,7 @@ async def rollback_clock_to_madness(fake_start_time_tuple):
 
         print(f"counter {counter} delay {delay} sleep_duration = {sleep_duration} subtract_secs {subtract_secs}")
 
-        panel_attract_functions.update_clock_display(new_values, old_values, delay=delay, reverse=True)
+        await panel_attract_functions.update_clock_display_async(new_values, old_values, delay=delay, reverse=True)
 
         await uasyncio.sleep(sleep_duration)
 
@@ -89,7 +89,7 @@ async def main():
 
 if __name__ == "__main__":
     utils.clear_picoboard()
-    datetime_utils.sync_rtc()
+    uasyncio.run(datetime_utils.sync_rtc())
     uasyncio.run(main())
 
     # print(utime.localtime())
\ No newline at end of file
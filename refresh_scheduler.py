@@ -0,0 +1,109 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: refresh_scheduler.py
+Description: Schedules online data cache refreshes by deadline. Keeps a priority queue of when each cache item
+expires, and refreshes the most urgent items in the next quiet (static display) window before they expire. The quiet
+windows also look up the NTP servers ahead of each RTC sync.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import heapq
+import utime  # type: ignore
+import uasyncio
+import config
+import datetime_utils
+
+
+# Class to represent the refresh scheduler object
+class RefreshScheduler:
+    def __init__(self, cache):
+        self.cache = cache
+        # Heap of (due_time, cache_item), earliest first. An item is due when its data expires.
+        self.queue = []
+        # Cache item -> [on time refreshes, late refreshes, failed refreshes]
+        self.stats = {}
+
+        for cache_item in cache.updaters:
+            self.schedule(cache_item)
+            self.stats[cache_item] = [0, 0, 0]
+
+    # Queue the next refresh of a cache item, due when it expires (now if it has no data),
+    # or after a retry delay if its last refresh failed
+    def schedule(self, cache_item, failed=False):
+        if failed:
+            # No sooner than the source's circuit breaker will let a fetch through
+            due_time = utime.time() + max(config.REFRESH_RETRY_SECS, self.cache.retry_after(cache_item))
+        else:
+            due_time = self.cache.cache_expiry[cache_item] or utime.time()
+
+        heapq.heappush(self.queue, (due_time, cache_item))
+
+    # Refresh the items that are due before the next quiet window is likely, most urgent first.
+    # Call while a static display is showing, or from run_background().
+    async def run_quiet_window(self):
+        refreshed = []
+        # Items already refreshed in this window that fell due again, put back for the next window
+        deferred = []
+
+        try:
+            while (
+                self.queue
+                and len(refreshed) < config.REFRESH_MAX_PER_WINDOW
+                and self.queue[0][0] <= utime.time() + config.REFRESH_LOOKAHEAD_SECS
+            ):
+                entry = heapq.heappop(self.queue)
+                if entry[1] in refreshed:
+                    # Don't refresh an item twice in the same window, but let the other due items have their turn
+                    deferred.append(entry)
+                    continue
+
+                refreshed.append(entry[1])
+                await self.refresh(entry[1])
+        finally:
+            for entry in deferred:
+                heapq.heappush(self.queue, entry)
+
+        # And to look up the NTP servers before the next RTC sync, so it doesn't block on DNS
+        datetime_utils.resolve_ntp_servers_if_due()
+
+        # A quiet window is a good time to write to flash, too
+        if refreshed:
+            self.cache.save_snapshot()
+
+    # Refresh one item, count how it went, and schedule its next refresh
+    async def refresh(self, cache_item):
+        previous_expiry = self.cache.cache_expiry[cache_item]
+        failed = False
+
+        try:
+            await self.cache.updaters[cache_item]()
+
+            # Updaters print and swallow their errors, so an unchanged expiry means the update failed
+            failed = self.cache.cache_expiry[cache_item] == previous_expiry
+            if failed:
+                self.stats[cache_item][2] += 1
+            elif previous_expiry is None or utime.time() <= previous_expiry:
+                self.stats[cache_item][0] += 1
+            else:
+                self.stats[cache_item][1] += 1
+        finally:
+            # Also reschedules if the window timed out and cancelled the refresh
+            self.schedule(cache_item, failed)
+
+    # Run refreshes as they fall due, alongside whatever is on the display
+    async def run_background(self):
+        while True:
+            await self.run_quiet_window()
+
+            # Sleep until the next item is due, less the lookahead the quiet windows use
+            sleep_secs = config.REFRESH_RETRY_SECS
+            if self.queue:
+                sleep_secs = max(1, self.queue[0][0] - utime.time() - config.REFRESH_LOOKAHEAD_SECS)
+            await uasyncio.sleep(min(sleep_secs, config.REFRESH_RETRY_SECS))
+
+    def print_report(self):
+        print("Cache refreshes: on time, late, failed")
+        for cache_item, (on_time, late, failed) in self.stats.items():
+            print(f"  {cache_item}: {on_time}, {late}, {failed}")
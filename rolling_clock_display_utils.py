@@ -9,6 +9,11 @@ License: GNU General Public License (GPL)
 """
 import config
 import utils
+import framebuffer_utils
+
+# Every digit roll frame, pre-rendered once by build_digit_roll_sprites(). One byte per row, bit 0 = leftmost column.
+# Sprites are indexed by (reverse, loop_num, old_number, new_number), see get_sprite_offset()
+digit_roll_sprites = None
 
 def show_digit(number_to_show, x_pos, y_pos):
     """Display a single digit at the specified position."""
@@ -18,6 +23,94 @@ def show_digit(number_to_show, x_pos, y_pos):
     config.picoboard.set_pen(config.PEN_YELLOW)
     config.picoboard.text(text = str(number_to_show), x1 = x_pos, y1 = y_pos, wordwrap = -1, scale = 1)
     
+def get_roll_offsets(reverse, loop_num):
+    # Y offsets of the old and new number glyphs, relative to the top of the digit window, for one row of the roll
+    if not reverse:
+        old_offset = -(loop_num + 1)
+        new_offset = config.char_height - (loop_num + 1)
+    else:
+        loop_num = config.char_height - (5 - loop_num) - 1
+        new_offset = loop_num - config.char_height
+        old_offset = loop_num
+
+    return old_offset, new_offset
+
+def get_sprite_offset(old_number, new_number, loop_num, reverse):
+    return ((((6 if reverse else 0) + loop_num) * 10 + old_number) * 10 + new_number) * config.char_height
+
+def capture_digit_glyphs():
+    # Render each digit once at y = 0 and read back its rows as bitmasks.
+    # Draws in the framebuffer, so saves it first and puts it back after, in case a frame is part drawn.
+    framebuffer = framebuffer_utils.get_framebuffer()
+    bytes_per_pixel = framebuffer_utils.get_bytes_per_pixel(framebuffer)
+    saved_frame = bytes(framebuffer)
+    glyphs = []
+
+    for digit in range(10):
+        config.picoboard.set_pen(config.PEN_BLACK)
+        config.picoboard.clear()
+        config.picoboard.set_pen(config.PEN_YELLOW)
+        config.picoboard.text(text = str(digit), x1 = 0, y1 = 0, wordwrap = -1, scale = 1)
+
+        rows = bytearray(config.DISPLAY_HEIGHT)
+        for x in range(config.char_width):
+            bits = framebuffer_utils.read_column_bits(framebuffer, x, bytes_per_pixel)
+            for y in range(config.DISPLAY_HEIGHT):
+                if bits & (1 << y):
+                    rows[y] |= 1 << x
+        glyphs.append(rows)
+
+    framebuffer[:] = saved_frame
+
+    return glyphs
+
+def build_digit_roll_sprites():
+    # Build the table of every digit transition x 6 rows x both directions (6000 bytes). Call once at startup, so
+    # the first roll doesn't stall while it's built. Leaves the framebuffer as it was.
+    global digit_roll_sprites
+
+    glyphs = capture_digit_glyphs()
+    sprites = bytearray(2 * 6 * 10 * 10 * config.char_height)
+
+    for reverse in (False, True):
+        for loop_num in range(6):
+            old_offset, new_offset = get_roll_offsets(reverse, loop_num)
+            for old_number in range(10):
+                for new_number in range(10):
+                    sprite_offset = get_sprite_offset(old_number, new_number, loop_num, reverse)
+                    for row in range(config.char_height):
+                        bits = 0
+                        if 0 <= row - old_offset < config.DISPLAY_HEIGHT:
+                            bits |= glyphs[old_number][row - old_offset]
+                        if 0 <= row - new_offset < config.DISPLAY_HEIGHT:
+                            bits |= glyphs[new_number][row - new_offset]
+                        sprites[sprite_offset + row] = bits
+
+    digit_roll_sprites = sprites
+
+def blit_digit_roll(old_number, new_number, x_pos, y_pos, loop_num, reverse):
+    # Same output as scroll_digit(), but copied from the sprite table with no text rendering or allocation
+    if digit_roll_sprites is None:
+        # Not built at startup. Safe mid frame, as building leaves the framebuffer as it was.
+        build_digit_roll_sprites()
+
+    # Matches the offset in scroll_digit()
+    y_pos = y_pos + 1
+
+    config.picoboard.set_pen(config.PEN_BLACK)
+    config.picoboard.rectangle(x_pos, y_pos, config.char_width, config.char_height)
+    config.picoboard.set_pen(config.PEN_YELLOW)
+
+    sprite_offset = get_sprite_offset(old_number, new_number, loop_num, reverse)
+    for row in range(config.char_height):
+        bits = digit_roll_sprites[sprite_offset + row]
+        x = x_pos
+        while bits:
+            if bits & 1:
+                config.picoboard.pixel(x, y_pos + row)
+            bits >>= 1
+            x += 1
+
 def scroll_digit(params):
     # Scroll one vertical row of a single digit at the specified position. 
     # Call in a 6 x loop (loop_num 0 to 5), once for each vertical row of pixels
@@ -0,0 +1,96 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: rtc_drift.py
+Description: Drift tracker for the RTC. Each NTP sync measures how far the RTC had drifted since the last one, which
+gives a running estimate of how fast it gains or loses. Between syncs, the RTC is stepped a second at a time to
+follow the estimate, each time it's reckoned to be half a second out. The sync interval doubles while the clock
+stays well within the error bound, and halves when it goes past it.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import config
+
+
+# Class to represent the drift estimate of the RTC
+class DriftEstimator:
+    def __init__(
+        self,
+        max_error_ms=config.RTC_MAX_ERROR_MS,
+        min_interval_secs=config.RTC_SYNC_MIN_SECS,
+        max_interval_secs=config.RTC_SYNC_MAX_SECS,
+        initial_interval_secs=config.RTC_SYNC_INITIAL_SECS,
+        smoothing=config.RTC_DRIFT_SMOOTHING,
+    ):
+        self.max_error_ms = max_error_ms
+        self.min_interval_secs = min_interval_secs
+        self.max_interval_secs = max_interval_secs
+        self.smoothing = smoothing
+        self.interval_secs = initial_interval_secs
+        # How fast the RTC gains (positive) or loses (negative), in parts per million. None until two syncs.
+        self.drift_ppm = None
+        # RTC time of the last sync
+        self.last_sync_time = None
+        # Milliseconds the RTC has been stepped by since the last sync
+        self.corrected_ms = 0
+        # NTP time less RTC time at the last sync, before the RTC was set, and when the next sync is due
+        self.last_offset_ms = None
+        self.next_sync_time = None
+
+    # Record a sync that found the RTC offset_ms behind NTP time (negative if ahead), and set it right at sync_time.
+    # Returns the seconds until the next sync.
+    def record_sync(self, offset_ms, sync_time):
+        if self.last_sync_time is not None:
+            elapsed_secs = sync_time - self.last_sync_time
+            # Too soon after the last sync (e.g. a retry) to tell drift from measurement error
+            if elapsed_secs >= self.min_interval_secs:
+                # The RTC's own drift: the offset it built up, plus what the steps took back
+                sample_ppm = -(offset_ms + self.corrected_ms) * 1000 / elapsed_secs
+                if self.drift_ppm is None:
+                    self.drift_ppm = sample_ppm
+                else:
+                    self.drift_ppm += self.smoothing * (sample_ppm - self.drift_ppm)
+
+            # The offset is what the steps didn't catch, so sync more or less often to keep it under the bound
+            if abs(offset_ms) > self.max_error_ms:
+                self.interval_secs = max(self.interval_secs // 2, self.min_interval_secs)
+            elif abs(offset_ms) < self.max_error_ms // 2:
+                self.interval_secs = min(self.interval_secs * 2, self.max_interval_secs)
+
+        self.last_sync_time = sync_time
+        self.corrected_ms = 0
+        self.last_offset_ms = offset_ms
+        self.next_sync_time = sync_time + self.interval_secs
+        return self.interval_secs
+
+    # RTC time at which the estimate says the RTC is half a second out, counting the steps taken so far, so should
+    # be stepped. None if it won't be before the next sync.
+    def next_step_time(self):
+        if not self.drift_ppm or self.last_sync_time is None:
+            return None
+
+        step_time = self.last_sync_time + int((abs(self.corrected_ms) + 500) * 1000 / abs(self.drift_ppm))
+        if self.next_sync_time is not None and step_time >= self.next_sync_time:
+            return None
+        return step_time
+
+    # Take a step. Returns the seconds to add to the RTC: -1 if it gains, 1 if it loses.
+    def step(self):
+        step_secs = -1 if self.drift_ppm > 0 else 1
+        self.corrected_ms += step_secs * 1000
+        if self.next_sync_time is not None:
+            # The sync is due at the same true time, which is a second earlier or later on the RTC
+            self.next_sync_time += step_secs
+        return step_secs
+
+    def report(self, now):
+        if self.drift_ppm is None:
+            drift = "not known yet"
+        else:
+            drift = f"{self.drift_ppm:+.1f} ppm ({self.drift_ppm * 86400 / 1000000:+.2f} s/day)"
+        next_sync = "not scheduled" if self.next_sync_time is None else f"in {self.next_sync_time - now}s"
+        return (
+            f"drift {drift}, last offset {self.last_offset_ms} ms, "
+            f"sync interval {self.interval_secs}s, next sync {next_sync}"
+        )
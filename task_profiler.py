@@ -0,0 +1,100 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: task_profiler.py
+Description: Optional profiling of the attract mode tasks: duration, frames drawn, timeouts and event loop hold time.
+Each report covers the runs since the last one.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import utime  # type: ignore
+import uasyncio
+import utils
+
+# How often the lag probe wakes up. Any extra delay before it runs is time another coroutine held the event loop.
+LAG_PROBE_MS = 10
+
+# Columns of each row in the profile table
+RUNS = 0
+TOTAL_MS = 1
+MIN_MS = 2
+MAX_MS = 3
+FRAMES = 4
+TIMEOUTS = 5
+HELD_MS = 6
+MAX_HELD_MS = 7
+
+
+# Frames the tasks have drawn: pushed to the panel, or skipped as unchanged
+def frames_drawn():
+    return utils.display_update_stats["pushed"] + utils.display_update_stats["skipped"]
+
+
+# Class to represent the task profiler object
+class TaskProfiler:
+    def __init__(self, max_tasks):
+        self.max_tasks = max_tasks
+        # Task name -> row of counters since the last report, see the column indices above
+        self.table = {}
+        self.task_start_ms = None
+        self.task_start_frames = 0
+        self.held_ms = 0
+        self.max_held_ms = 0
+
+    # Call just before a task starts
+    def start_task(self):
+        self.task_start_ms = utime.ticks_ms()
+        self.task_start_frames = frames_drawn()
+        self.held_ms = 0
+        self.max_held_ms = 0
+
+    # Call when a task ends, to add its run to the table
+    def end_task(self, task_name, timed_out):
+        duration_ms = utime.ticks_diff(utime.ticks_ms(), self.task_start_ms)
+        frames = frames_drawn() - self.task_start_frames
+
+        row = self.table.get(task_name)
+        if row is None:
+            if len(self.table) >= self.max_tasks:
+                # Table is full, so don't grow the heap for a task name we've not seen
+                return
+            row = [0] * 8
+            self.table[task_name] = row
+
+        if row[RUNS] == 0:
+            row[MIN_MS] = row[MAX_MS] = duration_ms
+        row[RUNS] += 1
+        row[TOTAL_MS] += duration_ms
+        row[MIN_MS] = min(row[MIN_MS], duration_ms)
+        row[MAX_MS] = max(row[MAX_MS], duration_ms)
+        row[FRAMES] += frames
+        row[TIMEOUTS] += 1 if timed_out else 0
+        row[HELD_MS] += self.held_ms
+        row[MAX_HELD_MS] = max(row[MAX_HELD_MS], self.max_held_ms)
+
+    # Run alongside the tasks to measure how long they hold the event loop without yielding
+    async def monitor_loop_lag(self):
+        while True:
+            probe_start = utime.ticks_ms()
+            await uasyncio.sleep_ms(LAG_PROBE_MS)
+            lag_ms = utime.ticks_diff(utime.ticks_ms(), probe_start) - LAG_PROBE_MS
+
+            if lag_ms > 0:
+                self.held_ms += lag_ms
+                self.max_held_ms = max(self.max_held_ms, lag_ms)
+
+    # Print the runs since the last report, then start counting afresh. The rows are zeroed in place, so the table
+    # doesn't churn the heap.
+    def print_report(self):
+        print("Task profile since last report: runs, min/avg/max ms, frames drawn, timeouts, loop held total/max ms")
+        for task_name, row in self.table.items():
+            if row[RUNS] == 0:
+                continue
+            avg_ms = row[TOTAL_MS] // row[RUNS]
+            print(
+                f"  {task_name}: {row[RUNS]}, {row[MIN_MS]}/{avg_ms}/{row[MAX_MS]}, {row[FRAMES]}, "
+                f"{row[TIMEOUTS]}, {row[HELD_MS]}/{row[MAX_HELD_MS]}"
+            )
+            for column in range(len(row)):
+                row[column] = 0
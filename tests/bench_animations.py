@@ -0,0 +1,170 @@
+"""
+Benchmark the hot display paths on a computer, with no panel attached. Counts draw calls per animation and per
+(virtual) second, and reports wall time and peak allocations. Exits non-zero when a draw call count or the peak
+allocation goes over tests/bench_baseline.json, so a change that makes an animation more expensive fails.
+Run from the repo root: python tests/bench_animations.py [--update-baseline]
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import host_shims
+
+host_shims.install()
+# Only sleeps move the clock, so the frame pacing and the call counts are the same on any machine
+host_shims.clock.include_real_time = False
+
+import uasyncio
+import config
+import frame_recorder
+import panel_attract_functions
+import panel_liveshow
+import utils
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+COUNTED_CALLS = ("text", "rectangle", "set_clip", "clear", "pixel", "pixel_span", "update")
+# Allowed growth over the baseline before a benchmark fails
+ALLOC_TOLERANCE = 1.25
+
+
+class CountingPicoGraphics(frame_recorder.HeadlessPicoGraphics):
+    def __init__(self):
+        super().__init__()
+        self.counts = dict.fromkeys(COUNTED_CALLS, 0)
+
+    def text(self, *args, **kwargs):
+        self.counts["text"] += 1
+        super().text(*args, **kwargs)
+
+    def rectangle(self, *args):
+        self.counts["rectangle"] += 1
+        super().rectangle(*args)
+
+    def set_clip(self, *args):
+        self.counts["set_clip"] += 1
+        super().set_clip(*args)
+
+    def clear(self):
+        self.counts["clear"] += 1
+        super().clear()
+
+    def pixel(self, x, y):
+        self.counts["pixel"] += 1
+        super().pixel(x, y)
+
+    def pixel_span(self, x, y, length):
+        self.counts["pixel_span"] += 1
+        super().pixel_span(x, y, length)
+
+
+class CountingUnicorn(frame_recorder.RecordingUnicorn):
+    def update(self, graphics):
+        graphics.counts["update"] += 1
+        super().update(graphics)
+
+
+def run_benchmark(name, coro_fn):
+    random.seed(0)
+    config.picoboard = CountingPicoGraphics()
+    config.gu = CountingUnicorn()
+    # Start each benchmark with nothing pushed, so the frame-diff layer behaves the same every run
+    utils.last_pushed_frame_crc = None
+    # Layouts are cached across calls on the panel, but each benchmark should measure a cold start
+    utils.layout_cache.entries.clear()
+
+    virtual_start = host_shims.clock.now()
+    tracemalloc.start()
+    wall_start = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        uasyncio.run(coro_fn())
+
+    wall_secs = time.perf_counter() - wall_start
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    virtual_secs = host_shims.clock.now() - virtual_start
+
+    result = dict(config.picoboard.counts)
+    result["peak_alloc_bytes"] = peak_alloc
+    print(f"{name}: {virtual_secs:.2f}s animated in {wall_secs * 1000:.0f}ms wall, peak alloc {peak_alloc} bytes")
+    print(f"    {', '.join(f'{call} {result[call]}' for call in COUNTED_CALLS)}")
+    # Static displays don't sleep, so take no virtual time
+    if virtual_secs > 0:
+        print(f"    {', '.join(f'{call} {result[call] / virtual_secs:.0f}/s' for call in COUNTED_CALLS)}")
+
+    return result
+
+
+async def bench_scroll_msg():
+    await utils.scroll_msg("Next stop: Penmaenmawr. Please mind the gap between the train and the platform")
+
+
+async def bench_show_static_message():
+    for _ in range(10):
+        utils.show_static_message("Pressure: 1013 hPa", config.PEN_GREY, 1.0)
+        utils.show_static_message("Temp: 21c", config.PEN_GREY, 1.0)
+
+
+async def bench_update_clock_display():
+    # Every digit changes, the worst case for one tick
+    panel_attract_functions.update_clock_display([0, 0, 0, 0, 0, 0], [2, 3, 5, 9, 5, 9])
+
+
+async def bench_rollback_clock_to_madness():
+    await panel_liveshow.rollback_clock_to_madness((2024, 1, 1, 12, 0, 0, 0, 1))
+
+
+BENCHMARKS = (
+    ("scroll_msg", bench_scroll_msg),
+    ("show_static_message", bench_show_static_message),
+    ("update_clock_display", bench_update_clock_display),
+    ("rollback_clock_to_madness", bench_rollback_clock_to_madness),
+)
+
+
+def find_regressions(name, result, baseline):
+    regressions = []
+    for key, value in result.items():
+        allowed = baseline.get(key)
+        if allowed is None:
+            continue
+        if key == "peak_alloc_bytes":
+            allowed = allowed * ALLOC_TOLERANCE
+        if value > allowed:
+            regressions.append(f"{name}: {key} {value} is over the baseline {baseline[key]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    # Build the sprite table up front, as the panel does at startup
+    config.picoboard = CountingPicoGraphics()
+    panel_attract_functions.rolling_clock_display_utils.build_digit_roll_sprites()
+    # Set up the host event loop once, so its one-off cost isn't counted against the first benchmark
+    uasyncio.run(uasyncio.sleep(0))
+
+    results = {name: run_benchmark(name, coro_fn) for name, coro_fn in BENCHMARKS}
+
+    if "--update-baseline" in sys.argv:
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        sys.exit(0)
+
+    with open(BASELINE_PATH) as baseline_file:
+        baselines = json.load(baseline_file)
+
+    regressions = []
+    for name, result in results.items():
+        regressions += find_regressions(name, result, baselines.get(name, {}))
+
+    if regressions:
+        print("\n".join(regressions))
+        sys.exit(1)
+
+    print("No regressions against the baseline")
@@ -0,0 +1,202 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: host_shims.py
+Description: Stand-ins for the MicroPython and Pimoroni modules, so the project can be imported and its animations
+replayed with CPython on a normal computer. Time is virtual: sleeps return at once and advance the clock instead.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import asyncio
+import calendar
+import os
+import random
+import sys
+import time
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 1st Jan 2024, 12:00:00
+DEFAULT_START_TIME = 1704110400
+
+
+class VirtualClock:
+    # Real elapsed time plus the total of every sleep, so render cost still shows up in frame intervals.
+    # With include_real_time off, only sleeps move the clock, which makes runs repeatable.
+    def __init__(self, start_time=DEFAULT_START_TIME):
+        self.start_time = start_time
+        self.real_start = time.perf_counter()
+        self.slept = 0.0
+        self.include_real_time = True
+
+    def now(self):
+        real_elapsed = time.perf_counter() - self.real_start if self.include_real_time else 0.0
+        return self.start_time + real_elapsed + self.slept
+
+    def advance(self, secs):
+        if secs > 0:
+            self.slept += secs
+
+
+clock = VirtualClock()
+
+
+def mktime(time_tuple):
+    # Like MicroPython, months and days out of range roll over into the next year or month
+    year, month, day, hour, minute, second = time_tuple[:6]
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return calendar.timegm((year, month, 1, hour, minute, second)) + (day - 1) * 86400
+
+
+def localtime(secs=None):
+    t = time.gmtime(clock.now() if secs is None else secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+def make_utime():
+    utime = types.ModuleType("utime")
+    utime.time = lambda: int(clock.now())
+    utime.ticks_ms = lambda: int(clock.now() * 1000)
+    utime.ticks_us = lambda: int(clock.now() * 1000000)
+    utime.ticks_diff = lambda new, old: new - old
+    utime.ticks_add = lambda ticks, delta: ticks + delta
+    utime.sleep = clock.advance
+    utime.sleep_ms = lambda ms: clock.advance(ms / 1000)
+    utime.sleep_us = lambda us: clock.advance(us / 1000000)
+    utime.localtime = localtime
+    utime.gmtime = localtime
+    utime.mktime = mktime
+    return utime
+
+
+def make_uasyncio():
+    uasyncio = types.ModuleType("uasyncio")
+    uasyncio.__dict__.update(
+        {name: getattr(asyncio, name) for name in dir(asyncio) if not name.startswith("_")}
+    )
+
+    async def sleep(secs):
+        clock.advance(secs)
+        await asyncio.sleep(0)
+
+    async def sleep_ms(ms):
+        await sleep(ms / 1000)
+
+    # MicroPython has one event loop that run() leaves open, so streams (e.g. pooled connections) outlive each run
+    loop = asyncio.new_event_loop()
+
+    def run(coro):
+        return loop.run_until_complete(coro)
+
+    uasyncio.sleep = sleep
+    uasyncio.sleep_ms = sleep_ms
+    uasyncio.run = run
+    return uasyncio
+
+
+def make_module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+class GalacticUnicorn:
+    WIDTH = 53
+    HEIGHT = 11
+    SWITCH_BRIGHTNESS_UP = 21
+    SWITCH_BRIGHTNESS_DOWN = 26
+
+    def __init__(self):
+        self.brightness = 0.5
+
+    def update(self, graphics):
+        pass
+
+    def get_brightness(self):
+        return self.brightness
+
+    def set_brightness(self, brightness):
+        self.brightness = max(0.0, min(1.0, brightness))
+
+    def adjust_brightness(self, delta):
+        self.set_brightness(self.brightness + delta)
+
+    def is_pressed(self, switch):
+        return False
+
+
+class WLAN:
+    def __init__(self, interface=None):
+        pass
+
+    def active(self, *args):
+        return False
+
+    def config(self, **kwargs):
+        pass
+
+    def connect(self, *args):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def status(self):
+        return -1
+
+    def isconnected(self):
+        return False
+
+
+# For tests that fetch: shows the Wi-Fi as connected until the test ends
+def connect_wifi(monkeypatch):
+    monkeypatch.setattr(WLAN, "status", lambda self: 3)
+    monkeypatch.setattr(WLAN, "isconnected", lambda self: True)
+
+
+class RTC:
+    def datetime(self, datetime_tuple=None):
+        if datetime_tuple is None:
+            t = localtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        year, month, day, _, hour, minute, second, _ = datetime_tuple
+        clock.start_time += mktime((year, month, day, hour, minute, second)) - clock.now()
+
+
+def install():
+    # Call before importing any project module
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    sys.modules.update(
+        {
+            "utime": make_utime(),
+            "uasyncio": make_uasyncio(),
+            "urandom": make_module("urandom", getrandbits=random.getrandbits, randint=random.randint),
+            "galactic": make_module("galactic", GalacticUnicorn=GalacticUnicorn),
+            "pimoroni_i2c": make_module("pimoroni_i2c", PimoroniI2C=object),
+            "breakout_bme68x": make_module(
+                "breakout_bme68x",
+                BreakoutBME68X=object,
+                STATUS_HEATER_STABLE=0,
+                FILTER_COEFF_3=0,
+                STANDBY_TIME_1000_MS=0,
+                OVERSAMPLING_16X=0,
+                OVERSAMPLING_2X=0,
+                OVERSAMPLING_1X=0,
+            ),
+            "wifi_creds": make_module("wifi_creds", WIFI_SSID="host", WIFI_PASSWORD="host"),
+            "network": make_module("network", WLAN=WLAN, STA_IF=0),
+            "machine": make_module("machine", RTC=RTC),
+        }
+    )
+
+    # Imported once utime is in place, as the headless board lives in the project
+    import frame_recorder
+
+    sys.modules["picographics"] = make_module(
+        "picographics", PicoGraphics=frame_recorder.HeadlessPicoGraphics, DISPLAY_GALACTIC_UNICORN=0
+    )
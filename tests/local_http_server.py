@@ -0,0 +1,102 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: local_http_server.py
+Description: A local HTTP stand-in for the TFL API and the Gist, for host tests of the online data cache.
+Serves fixed bodies per path, honours If-None-Match and If-Modified-Since, and counts requests.
+Optionally serves over TLS with a given certificate, and can send bodies with chunked transfer encoding.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import http.server
+import json
+import ssl
+import threading
+
+
+class LocalHTTPServer:
+    # certificate is an optional (certfile, keyfile) pair to serve https
+    def __init__(self, certificate=None):
+        # Path -> (body bytes, extra response headers)
+        self.routes = {}
+        # Paths whose bodies are sent in chunks of this many bytes
+        self.chunked = {}
+        self.requests = []
+        self.full_responses = 0
+        self.client_ports = []
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                # Distinct client ports are distinct connections
+                server.client_ports.append(self.client_address[1])
+
+                if self.path not in server.routes:
+                    self.send_error(404)
+                    return
+
+                body, headers = server.routes[self.path]
+                etag = headers.get("ETag")
+                last_modified = headers.get("Last-Modified")
+                if (etag is not None and self.headers.get("If-None-Match") == etag) or (
+                    last_modified is not None and self.headers.get("If-Modified-Since") == last_modified
+                ):
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                server.full_responses += 1
+                chunk_size = server.chunked.get(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if chunk_size is None:
+                    self.send_header("Content-Length", str(len(body)))
+                else:
+                    self.send_header("Transfer-Encoding", "chunked")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+                if chunk_size is None:
+                    self.wfile.write(body)
+                else:
+                    for start in range(0, len(body), chunk_size):
+                        chunk = body[start : start + chunk_size]
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.scheme = "http"
+        if certificate is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*certificate)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = "https"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f"{self.scheme}://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def set_json(self, path, document, chunk_size=None, **headers):
+        self.routes[path] = (json.dumps(document).encode(), {name.replace("_", "-"): value for name, value in headers.items()})
+        if chunk_size is None:
+            self.chunked.pop(path, None)
+        else:
+            self.chunked[path] = chunk_size
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,77 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: local_ntp_server.py
+Description: A local UDP stand-in for an NTP server, for host tests of the NTP client. Runs on the test's event loop
+and answers on the virtual clock, plus an offset, after a delay counted on the virtual clock. Can also stay silent
+or send answers that should be rejected.
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+import asyncio
+import struct
+import host_shims
+
+NTP_DELTA = 2208988800
+
+
+def ntp_timestamp(secs):
+    whole = int(secs)
+    return whole + NTP_DELTA, int((secs - whole) * (1 << 32))
+
+
+class LocalNTPServer(asyncio.DatagramProtocol):
+    # offset_secs: how far the server's clock is ahead of the virtual clock. delay_ms: how long the answer takes
+    # to come back. reply: False for a server that never answers. stratum: 0 for an unsynchronised server.
+    def __init__(self, offset_secs=0, delay_ms=0, reply=True, stratum=1):
+        self.offset_secs = offset_secs
+        self.delay_ms = delay_ms
+        self.reply = reply
+        self.stratum = stratum
+        self.requests = 0
+        self.transport = None
+        # (due time on the virtual clock, response, client address)
+        self.pending = []
+        self.sender_task = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=("127.0.0.1", 0))
+        self.sender_task = asyncio.ensure_future(self.send_due())
+        return self
+
+    @property
+    def address(self):
+        host, port = self.transport.get_extra_info("sockname")[:2]
+        return f"{host}:{port}"
+
+    def close(self):
+        self.sender_task.cancel()
+        self.transport.close()
+
+    def datagram_received(self, data, client_address):
+        self.requests += 1
+        if not self.reply:
+            return
+
+        response = bytearray(48)
+        response[0] = 0x24  # LI 0, version 4, mode 4 (server)
+        response[1] = self.stratum
+        # Echo the client's transmit timestamp as the originate timestamp
+        response[24:32] = data[40:48]
+        self.pending.append((host_shims.clock.now() + self.delay_ms / 1000, response, client_address))
+
+    # Send each answer once its delay has passed on the virtual clock, which moves as the client polls
+    async def send_due(self):
+        while True:
+            for entry in self.pending[:]:
+                due_time, response, client_address = entry
+                if host_shims.clock.now() >= due_time:
+                    self.pending.remove(entry)
+                    # Half the delay each way, so the server receives and answers halfway through the round trip
+                    transmit_time = due_time - self.delay_ms / 2000 + self.offset_secs
+                    struct.pack_into("!II", response, 40, *ntp_timestamp(transmit_time))
+                    struct.pack_into("!II", response, 32, *ntp_timestamp(transmit_time))
+                    self.transport.sendto(bytes(response), client_address)
+            await asyncio.sleep(0)
@@ -0,0 +1,44 @@
+"""
+Record the main animations to frame logs on a computer, with no panel attached, and print their frame stats.
+Run from the repo root: python tests/record_animations.py [output_dir]
+"""
+import os
+import sys
+
+import host_shims
+
+host_shims.install()
+
+import uasyncio
+import config
+import frame_recorder
+import panel_attract_functions
+import panel_liveshow
+import utils
+
+
+async def record(name, coro_fn, output_dir):
+    log_path = os.path.join(output_dir, f"{name}.agfr")
+    recorder = frame_recorder.install_recorder(log_path)
+    utils.clear_picoboard()
+    await coro_fn()
+    recorder.close()
+    config.gu = recorder.unicorn
+
+    print(f"{name}: {frame_recorder.summarise_frame_log(log_path)}")
+
+
+async def show_liveshow_rollback():
+    fake_time_tuple = await panel_liveshow.advance_clock_slowly(panel_attract_functions.datetime_utils.get_time_values())
+    await panel_liveshow.rollback_clock_to_madness(fake_time_tuple)
+
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+
+    async def record_all():
+        await record("scroll_msg", lambda: utils.scroll_msg("Next stop: Penmaenmawr, change here for the coast"), output_dir)
+        await record("rolling_clock", lambda: panel_attract_functions.rolling_clock(5), output_dir)
+        await record("liveshow_rollback", show_liveshow_rollback, output_dir)
+
+    uasyncio.run(record_all())
@@ -0,0 +1,180 @@
+import host_shims
+
+host_shims.install()
+
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import pytest
+import uasyncio
+import async_http
+import json_stream
+from local_http_server import LocalHTTPServer
+
+ARRIVALS = [{"lineName": "141", "timeToStation": 431}, {"lineName": "341", "timeToStation": 62}]
+
+
+def fetch_json(url, headers=None, ssl_context=True, pool=None):
+    async def fetch():
+        response = await async_http.get(url, headers=headers, ssl=ssl_context, pool=pool)
+        try:
+            body = await response.json() if response.status_code == 200 else None
+            return response.status_code, response.headers, body
+        finally:
+            await response.close()
+
+    return uasyncio.run(fetch())
+
+
+def test_parse_url():
+    assert async_http.parse_url("https://api.tfl.gov.uk/Line/piccadilly/Status") == (
+        "https",
+        "api.tfl.gov.uk",
+        443,
+        "/Line/piccadilly/Status",
+    )
+    assert async_http.parse_url("http://127.0.0.1:8080") == ("http", "127.0.0.1", 8080, "/")
+
+
+def test_content_length_body():
+    with LocalHTTPServer() as server:
+        server.set_json("/arrivals", ARRIVALS, ETag='"v1"')
+        status_code, headers, body = fetch_json(server.url("/arrivals"))
+        assert status_code == 200
+        assert headers["etag"] == '"v1"'
+        assert body == ARRIVALS
+
+
+def test_chunked_body_read_in_small_pieces():
+    with LocalHTTPServer() as server:
+        server.set_json("/arrivals", ARRIVALS, chunk_size=7)
+
+        async def scan():
+            items = []
+            response = await async_http.get(server.url("/arrivals"))
+            try:
+                scanner = json_stream.JSONKeyScanner(("timeToStation",), items.append)
+                await json_stream.scan_response(response, scanner, bytearray(5))
+            finally:
+                await response.close()
+            return items
+
+        assert uasyncio.run(scan()) == [{"timeToStation": 431}, {"timeToStation": 62}]
+
+
+def test_readinto_reuses_buffer():
+    with LocalHTTPServer() as server:
+        server.set_json("/arrivals", ARRIVALS, chunk_size=10)
+
+        async def read_all():
+            buffer = bytearray(8)
+            body = bytearray()
+            response = await async_http.get(server.url("/arrivals"))
+            try:
+                while True:
+                    count = await response.readinto(buffer)
+                    if not count:
+                        return bytes(body)
+                    assert count <= len(buffer)
+                    body += buffer[:count]
+            finally:
+                await response.close()
+
+        assert json.loads(uasyncio.run(read_all())) == ARRIVALS
+
+
+def test_not_modified():
+    with LocalHTTPServer() as server:
+        server.set_json("/gist", {"custom_message": "Hello"}, ETag='"v1"')
+        status_code, _, body = fetch_json(server.url("/gist"), headers={"If-None-Match": '"v1"'})
+        assert status_code == 304
+        assert body is None
+        assert server.requests[-1][1]["Connection"] == "close"
+
+
+def test_pool_reuses_connection():
+    with LocalHTTPServer() as server:
+        server.set_json("/arrivals", ARRIVALS, chunk_size=16)
+        server.set_json("/status", [{"id": "piccadilly"}], ETag='"v1"')
+        pool = async_http.ConnectionPool(idle_timeout=60, dns=async_http.DNSCache(ttl=300))
+
+        async def fetch_all():
+            bodies = []
+            for path, headers in (("/arrivals", None), ("/status", None), ("/status", {"If-None-Match": '"v1"'})):
+                response = await async_http.get(server.url(path), headers=headers, pool=pool)
+                try:
+                    bodies.append(await response.json() if response.status_code == 200 else response.status_code)
+                finally:
+                    await response.close()
+            return bodies
+
+        assert uasyncio.run(fetch_all()) == [ARRIVALS, [{"id": "piccadilly"}], 304]
+        assert len(set(server.client_ports)) == 1
+        assert server.requests[0][1]["Connection"] == "keep-alive"
+        assert pool.stats == {"hits": 2, "misses": 1, "stale": 0, "dns_hits": 0, "dns_misses": 1}
+
+        # Idle too long: a new connection, but the DNS lookup is still cached
+        uasyncio.run(uasyncio.sleep(61))
+        status_code, _, _ = fetch_json(server.url("/status"), headers=None, pool=pool)
+        assert status_code == 200
+        assert len(set(server.client_ports)) == 2
+        assert pool.stats["misses"] == 2
+        assert pool.stats["dns_hits"] == 1
+
+        pool.close_idle(all_connections=True)
+        assert pool.idle[("http", "127.0.0.1", server.httpd.server_address[1])] == []
+
+
+def test_pool_replaces_closed_connection():
+    with LocalHTTPServer() as server:
+        server.set_json("/status", [{"id": "piccadilly"}])
+        pool = async_http.ConnectionPool()
+
+        fetch_json(server.url("/status"), pool=pool)
+        # The server drops the idle connection
+        (reader, writer, _), = next(iter(pool.idle.values()))
+        writer.transport.abort()
+
+        status_code, _, body = fetch_json(server.url("/status"), pool=pool)
+        assert status_code == 200
+        assert body == [{"id": "piccadilly"}]
+        assert pool.stats["stale"] == 1
+
+
+@pytest.mark.skipif(shutil.which("openssl") is None, reason="needs openssl to make a test certificate")
+def test_tls():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        certfile = os.path.join(temp_dir, "cert.pem")
+        keyfile = os.path.join(temp_dir, "key.pem")
+        subprocess.run(
+            [
+                "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                "-keyout", keyfile, "-out", certfile,
+                "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        client_context = ssl.create_default_context(cafile=certfile)
+
+        with LocalHTTPServer(certificate=(certfile, keyfile)) as server:
+            server.set_json("/status", [{"id": "piccadilly"}], chunk_size=4)
+            assert server.url("/status").startswith("https://")
+            status_code, _, body = fetch_json(server.url("/status"), ssl_context=client_context)
+            assert status_code == 200
+            assert body == [{"id": "piccadilly"}]
+
+
+if __name__ == "__main__":
+    test_parse_url()
+    test_content_length_body()
+    test_chunked_body_read_in_small_pieces()
+    test_readinto_reuses_buffer()
+    test_not_modified()
+    test_pool_reuses_connection()
+    test_pool_replaces_closed_connection()
+    test_tls()
+    print("All async_http tests passed")
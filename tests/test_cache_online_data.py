@@ -0,0 +1,425 @@
+import host_shims
+
+host_shims.install()
+
+import os
+import tempfile
+import pytest
+import uasyncio
+import utime  # type: ignore
+import config
+import cache_online_data
+import data_sources
+import datetime_utils
+import refresh_scheduler
+import TFL
+from local_http_server import LocalHTTPServer
+
+
+def test_conditional_fetch_with_etag(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        server.set_json("/gist", {"custom_message": "Hello"}, ETag='"v1"')
+        monkeypatch.setattr(config, "custom_message_gist_URL", server.url("/gist"))
+        cache = cache_online_data.OnlineDataCache()
+
+        uasyncio.run(cache.update_source("custom_message"))
+        assert cache.get("custom_message") == "Hello"
+        assert cache.validators["custom_message"] == ('"v1"', None)
+
+        # Unchanged: 304, so the expiry is extended and nothing is parsed
+        cache.cache_expiry["custom_message"] = utime.time() - 1
+        uasyncio.run(cache.update_source("custom_message"))
+        assert server.requests[-1][1]["If-None-Match"] == '"v1"'
+        assert server.full_responses == 1
+        assert cache.get("custom_message") == "Hello"
+
+        # Changed: full response and new validators
+        server.set_json("/gist", {"custom_message": "Goodbye"}, ETag='"v2"')
+        uasyncio.run(cache.update_source("custom_message"))
+        assert server.full_responses == 2
+        assert cache.get("custom_message") == "Goodbye"
+        assert cache.validators["custom_message"] == ('"v2"', None)
+
+
+def test_conditional_fetch_with_last_modified(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    last_modified = "Mon, 01 Jan 2024 12:00:00 GMT"
+    with LocalHTTPServer() as server:
+        server.set_json(
+            "/Line/piccadilly/Status",
+            [{"id": "piccadilly", "lineStatuses": [{"statusSeverityDescription": "Good Service"}]}],
+            Last_Modified=last_modified,
+        )
+        monkeypatch.setattr(config, "TFL_API_URL", server.url(""))
+        cache = cache_online_data.OnlineDataCache()
+
+        uasyncio.run(cache.update_source("tfl_line_status"))
+        uasyncio.run(cache.update_source("tfl_line_status"))
+        assert server.requests[-1][1]["If-Modified-Since"] == last_modified
+        assert server.full_responses == 1
+        assert cache.get("line_status_piccadilly") == "Good Service"
+
+
+def test_no_conditional_headers_without_data():
+    cache = cache_online_data.OnlineDataCache()
+    cache.validators["custom_message"] = ('"v1"', None)
+    assert cache.get_conditional_headers("custom_message") == {}
+
+
+def test_stale_while_revalidate(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    # The quiet window saves a snapshot
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    with LocalHTTPServer() as server:
+        server.set_json("/gist", {"custom_message": "Hello"})
+        monkeypatch.setattr(config, "custom_message_gist_URL", server.url("/gist"))
+        cache = cache_online_data.OnlineDataCache()
+        uasyncio.run(cache.update_source("custom_message"))
+
+        # Past the soft expiry: served stale, and due in the refresh scheduler
+        cache.cache_expiry["custom_message"] = utime.time() - 10
+        data, age_secs, is_stale = cache.get_with_age("custom_message")
+        assert (data, is_stale) == ("Hello", True)
+        assert age_secs >= 0
+        scheduler = refresh_scheduler.RefreshScheduler(cache)
+        assert scheduler.queue[0] == (cache.cache_expiry["custom_message"], "custom_message")
+
+        server.set_json("/gist", {"custom_message": "Refreshed"})
+        uasyncio.run(scheduler.run_quiet_window())
+        assert cache.get_with_age("custom_message")[0::2] == ("Refreshed", False)
+
+        # Past the hard expiry: not served at all
+        cache.cache_expiry["custom_message"] = utime.time() - cache.sources["custom_message"].stale_grace_secs - 10
+        assert cache.get("custom_message") is None
+
+
+def test_routes_fetched_together_and_count_down_between_fetches(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        server.set_json(
+            "/Line/141,341,29/Arrivals/490008766S",
+            [
+                {"lineName": "141", "timeToStation": 431},
+                {"lineName": "341", "timeToStation": 10},
+                {"lineName": "N41", "timeToStation": 20},
+                {"lineName": "141", "timeToStation": 45},
+                {"lineName": "141", "expectedArrival": "2024-07-01T12:20:00Z"},
+            ],
+        )
+        monkeypatch.setattr(config, "TFL_API_URL", server.url(""))
+        cache = cache_online_data.OnlineDataCache(
+            (data_sources.bus_arrivals_source("tfl_arrivals", "490008766S", ("141", "341", "29")),)
+        )
+
+        # The response cap grows with the routes in the request
+        assert cache.sources["tfl_arrivals"].max_response_bytes == 3 * 32 * 1024
+
+        fetch_time = utime.time()
+        uasyncio.run(cache.update_source("tfl_arrivals"))
+        # One request, split into an item per route
+        assert len(server.requests) == 1
+        assert cache.get("next_buses_341") == [fetch_time + 10]
+        assert cache.get("next_buses_29") == []
+        arrival_times = cache.get("next_buses_141")
+        assert arrival_times[:2] == [fetch_time + 45, fetch_time + 431]
+        # 12:20 UTC is 13:20 BST on the RTC's clock
+        assert arrival_times[2] == utime.mktime((2024, 7, 1, 13, 20, 0, 0, 0))
+
+        # Counted down at display time, with departed buses dropped
+        assert TFL.format_next_buses(arrival_times[:2], fetch_time) == "due, 7"
+        assert TFL.format_next_buses(arrival_times[:2], fetch_time + 60) == "6"
+        assert TFL.format_next_buses(arrival_times[:2], fetch_time + 432) is None
+
+
+def test_lines_fetched_together(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        server.set_json(
+            "/Line/piccadilly,victoria/Status",
+            [
+                {"id": "piccadilly", "lineStatuses": [{"statusSeverityDescription": "Good Service"}]},
+                {"id": "victoria", "lineStatuses": [{"statusSeverityDescription": "Minor Delays"}]},
+            ],
+        )
+        monkeypatch.setattr(config, "TFL_API_URL", server.url(""))
+        cache = cache_online_data.OnlineDataCache((data_sources.line_status_source("tfl_line_status", ("piccadilly", "victoria")),))
+        assert cache.sources["tfl_line_status"].max_response_bytes == 2 * 32 * 1024
+
+        uasyncio.run(cache.update_source("tfl_line_status"))
+        assert len(server.requests) == 1
+        assert cache.get("line_status_piccadilly") == "Good Service"
+        assert cache.get("line_status_victoria") == "Minor Delays"
+
+        # A line left out of the next response loses its status, rather than keeping the old one as fresh
+        server.set_json(
+            "/Line/piccadilly,victoria/Status",
+            [{"id": "piccadilly", "lineStatuses": [{"statusSeverityDescription": "Part Suspended"}]}],
+        )
+        uasyncio.run(cache.update_source("tfl_line_status"))
+        assert cache.get("line_status_piccadilly") == "Part Suspended"
+        assert cache.get("line_status_victoria") is None
+        assert cache.get_display(("line_status_piccadilly", "line_status_victoria")).text is not None
+
+
+def test_sources_use_their_own_ttl_and_memory_budget(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        server.set_json(
+            "/Line/141/Arrivals/490008766S", [{"lineName": "141", "timeToStation": 60 * minutes} for minutes in range(1, 20)]
+        )
+        server.set_json("/gist", {"custom_message": "Hello"})
+        monkeypatch.setattr(config, "TFL_API_URL", server.url(""))
+        cache = cache_online_data.OnlineDataCache(
+            (
+                data_sources.bus_arrivals_source("tfl_arrivals", "490008766S", ("141",), ttl_secs=300, memory_budget_per_route=60),
+                data_sources.json_text_source("custom_message", server.url("/gist"), "custom_message", ttl_secs=3600),
+            )
+        )
+
+        now = utime.time()
+        uasyncio.run(cache.update_all_cache())
+        assert cache.cache_expiry["tfl_arrivals"] == now + 300
+        assert cache.cache_expiry["custom_message"] == now + 3600
+
+        # Each (route, timestamp) value takes 20 bytes as JSON, so 3 fit the budget and the rest are dropped as they arrive
+        assert len(cache.get("next_buses_141")) == 3
+        assert cache.values_dropped["tfl_arrivals"] == 16
+        assert cache.memory_used["next_buses_141"] <= 60
+        assert cache.memory_used["custom_message"] == len('"Hello"')
+
+
+def test_unsorted_arrivals_over_budget_keep_the_soonest(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        # In no particular order, as TFL lists them
+        seconds = {"141": (900, 60, 1500, 300, 1200, 30), "341": (700, 120, 400, 90)}
+        server.set_json(
+            "/Line/141,341/Arrivals/490008766S",
+            [
+                {"lineName": route, "timeToStation": seconds[route][index]}
+                for index in range(6)
+                for route in ("141", "341")
+                if index < len(seconds[route])
+            ],
+        )
+        monkeypatch.setattr(config, "TFL_API_URL", server.url(""))
+        # Room for 6 of the 10 arrivals, 3 per route
+        cache = cache_online_data.OnlineDataCache(
+            (data_sources.bus_arrivals_source("tfl_arrivals", "490008766S", ("141", "341"), memory_budget_per_route=60),)
+        )
+        assert cache.sources["tfl_arrivals"].memory_budget == 120
+
+        fetch_time = utime.time()
+        uasyncio.run(cache.update_source("tfl_arrivals"))
+        # Each route keeps its soonest buses
+        assert cache.get("next_buses_141") == [fetch_time + secs for secs in (30, 60, 300)]
+        assert cache.get("next_buses_341") == [fetch_time + secs for secs in (90, 120, 400)]
+        assert cache.values_dropped["tfl_arrivals"] == 4
+        assert cache.memory_used["next_buses_141"] + cache.memory_used["next_buses_341"] <= 120
+
+
+def test_response_size_cap(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        message = {"custom_message": "x" * 100}
+        server.set_json("/length", message)
+        server.set_json("/chunked", message, chunk_size=16)
+        cache = cache_online_data.OnlineDataCache(
+            (
+                data_sources.json_text_source("custom_message", server.url("/length"), "custom_message", max_response_bytes=64),
+                data_sources.json_text_source("chunked_message", server.url("/chunked"), "custom_message", max_response_bytes=64),
+            )
+        )
+
+        uasyncio.run(cache.update_all_cache())
+        # Refused from the Content-Length, or stopped as soon as the chunks passed the cap
+        assert cache.get("custom_message") is None
+        assert cache.get("chunked_message") is None
+
+        cache.sources["chunked_message"].max_response_bytes = 1024
+        uasyncio.run(cache.update_source("chunked_message"))
+        assert cache.get("chunked_message") == "x" * 100
+
+
+def test_chunked_sources_fetched_concurrently(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        first = "A" * 300
+        second = "B" * 300
+        server.set_json("/first", {"custom_message": first}, chunk_size=7)
+        server.set_json("/second", {"custom_message": second}, chunk_size=5)
+        cache = cache_online_data.OnlineDataCache(
+            (
+                data_sources.json_text_source("first_message", server.url("/first"), "custom_message"),
+                data_sources.json_text_source("second_message", server.url("/second"), "custom_message"),
+            )
+        )
+
+        # Both read at once, a chunk at a time, so each must scan from its own buffer
+        uasyncio.run(cache.update_all_cache())
+        assert cache.get("first_message") == first
+        assert cache.get("second_message") == second
+
+
+def test_prepared_display_text_and_versions():
+    cache = cache_online_data.OnlineDataCache(
+        (
+            data_sources.bus_arrivals_source("tfl_arrivals", "490008766S", ("141", "341")),
+            data_sources.json_text_source("custom_message", "http://unused/gist", "custom_message"),
+        )
+    )
+    bus_items = ("next_buses_141", "next_buses_341")
+    now = utime.time()
+    expiry_time = now + 300
+
+    # Nothing to show yet
+    display = cache.get_display(bus_items)
+    assert (display.text, display.version) == (None, 0)
+
+    cache.set("next_buses_141", [now + 30, now + 431], expiry_time)
+    cache.set("next_buses_341", [], expiry_time)
+    display = cache.get_display(bus_items)
+    assert (display.text, display.version) == ("Next 141: due, 7 mins", 1)
+
+    # Unchanged: the same text object, and a strip and width kept by the display code are reused
+    display.strip = bytearray(4)
+    display.width = 80
+    assert cache.get_display(bus_items).text is display.text
+    assert (display.version, display.strip, display.width) == (1, bytearray(4), 80)
+
+    # New arrival times that show the same minutes don't change the text
+    cache.set("next_buses_141", [now + 35, now + 435], expiry_time)
+    assert cache.get_display(bus_items).version == 1
+
+    # The text is only formatted again once a bus's minutes tick down, and the 30 second bus has gone
+    text_version = cache.text_versions["next_buses_141"]
+    uasyncio.run(uasyncio.sleep(15))
+    cache.get_display(bus_items)
+    assert cache.text_versions["next_buses_141"] == text_version
+    uasyncio.run(uasyncio.sleep(21))
+    display = cache.get_display(bus_items)
+    assert (display.text, display.version, display.strip, display.width) == ("Next 141: 6 mins", 2, None, None)
+
+    cache.set("next_buses_341", [utime.time() + 120], expiry_time)
+    assert cache.get_display(bus_items).text == "Next 141: 6 mins. Next 341: 2 mins"
+
+    cache.set("custom_message", "Hello", expiry_time)
+    assert cache.get_display(("custom_message",)).text == "Hello"
+
+    # Past the hard expiry: nothing to show
+    cache.cache_expiry["tfl_arrivals"] = utime.time() - cache.sources["tfl_arrivals"].stale_grace_secs - 10
+    display = cache.get_display(bus_items)
+    assert (display.text, display.version) == (None, 4)
+
+
+def test_utc_iso_to_local_timestamp():
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-01-15T08:00:00Z") == utime.mktime((2024, 1, 15, 8, 0, 0, 0, 0))
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-07-15T08:00:00.123Z") == utime.mktime((2024, 7, 15, 9, 0, 0, 0, 0))
+
+
+def test_snapshot_warm_boot(monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    now = utime.time()
+    cache = cache_online_data.OnlineDataCache()
+    cache.set("next_buses_141", [2, 9, 14], now - cache.sources["tfl_arrivals"].stale_grace_secs - 1)
+    cache.set("custom_message", "Hello", now - 60)
+    assert cache.save_snapshot()
+    # Nothing changed since, so no write
+    assert not cache.save_snapshot()
+
+    warm_cache = cache_online_data.OnlineDataCache()
+    # The message is stale but within its grace time, so it's shown while it refreshes. The bus times are past
+    # their hard expiry, so they're left for the scheduler to fetch.
+    assert warm_cache.load_snapshot() == ["custom_message"]
+    assert warm_cache.get_with_age("custom_message")[0::2] == ("Hello", True)
+    assert warm_cache.get("next_buses_141") is None
+
+
+def test_snapshot_saves_extended_expiry(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    with LocalHTTPServer() as server:
+        server.set_json("/gist", {"custom_message": "Hello"}, ETag='"v1"')
+        monkeypatch.setattr(config, "custom_message_gist_URL", server.url("/gist"))
+        cache = cache_online_data.OnlineDataCache()
+        uasyncio.run(cache.update_source("custom_message"))
+        assert cache.save_snapshot(force=True)
+
+        # Revalidated past its expiry: a 304 moves the expiry on, which the snapshot must keep
+        uasyncio.run(uasyncio.sleep(3700))
+        uasyncio.run(cache.update_source("custom_message"))
+        assert server.full_responses == 1
+        assert cache.save_snapshot()
+
+    # Reboot more than an hour after the first save
+    warm_cache = cache_online_data.OnlineDataCache()
+    assert warm_cache.load_snapshot() == ["custom_message"]
+    assert not warm_cache.is_expired("custom_message")
+
+
+def test_truncated_snapshot_not_loaded(monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    cache = cache_online_data.OnlineDataCache()
+    cache.set("custom_message", "Hello", utime.time() + 3600)
+    cache.save_snapshot()
+    with open(config.CACHE_SNAPSHOT_PATH, "rb") as snapshot_file:
+        snapshot = snapshot_file.read()
+
+    # Cut short in the header, and in an item
+    for length in (5, len(snapshot) - 3):
+        with open(config.CACHE_SNAPSHOT_PATH, "wb") as snapshot_file:
+            snapshot_file.write(snapshot[:length])
+        assert cache_online_data.OnlineDataCache().load_snapshot() == []
+
+
+def test_failed_snapshot_save_keeps_old_snapshot(monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    cache = cache_online_data.OnlineDataCache()
+    cache.set("custom_message", "Hello", utime.time() + 3600)
+    assert cache.save_snapshot()
+    assert not os.path.exists(config.CACHE_SNAPSHOT_PATH + ".tmp")
+
+    # The temporary file can't be written
+    os.mkdir(config.CACHE_SNAPSHOT_PATH + ".tmp")
+    cache.set("custom_message", "Goodbye", utime.time() + 3600)
+    assert not cache.save_snapshot(force=True)
+
+    warm_cache = cache_online_data.OnlineDataCache()
+    assert warm_cache.load_snapshot() == ["custom_message"]
+    assert warm_cache.get("custom_message") == "Hello"
+
+
+def test_snapshot_needs_clock_set(monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "cache_snapshot.bin"))
+    cache = cache_online_data.OnlineDataCache()
+    cache.set("custom_message", "Hello", utime.time() + 3600)
+    cache.save_snapshot()
+
+    # Power up with the RTC reset to an earlier date
+    host_shims.clock.start_time -= 10 * 365 * 86400
+    try:
+        assert cache_online_data.OnlineDataCache().load_snapshot() == []
+    finally:
+        host_shims.clock.start_time += 10 * 365 * 86400
+
+
+if __name__ == "__main__":
+    test_conditional_fetch_with_etag(pytest.MonkeyPatch())
+    test_conditional_fetch_with_last_modified(pytest.MonkeyPatch())
+    test_no_conditional_headers_without_data()
+    test_stale_while_revalidate(pytest.MonkeyPatch())
+    test_routes_fetched_together_and_count_down_between_fetches(pytest.MonkeyPatch())
+    test_lines_fetched_together(pytest.MonkeyPatch())
+    test_sources_use_their_own_ttl_and_memory_budget(pytest.MonkeyPatch())
+    test_unsorted_arrivals_over_budget_keep_the_soonest(pytest.MonkeyPatch())
+    test_response_size_cap(pytest.MonkeyPatch())
+    test_chunked_sources_fetched_concurrently(pytest.MonkeyPatch())
+    test_prepared_display_text_and_versions()
+    test_utc_iso_to_local_timestamp()
+    test_snapshot_warm_boot(pytest.MonkeyPatch())
+    test_snapshot_saves_extended_expiry(pytest.MonkeyPatch())
+    test_truncated_snapshot_not_loaded(pytest.MonkeyPatch())
+    test_failed_snapshot_save_keeps_old_snapshot(pytest.MonkeyPatch())
+    test_snapshot_needs_clock_set(pytest.MonkeyPatch())
+    print("All cache_online_data tests passed")
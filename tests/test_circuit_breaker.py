@@ -0,0 +1,93 @@
+import host_shims
+
+host_shims.install()
+
+import pytest
+import uasyncio
+import circuit_breaker
+import cache_online_data
+import data_sources
+from local_http_server import LocalHTTPServer
+
+
+def test_opens_after_threshold_and_backs_off():
+    breaker = circuit_breaker.CircuitBreaker(failure_threshold=3, backoff_base_secs=40, backoff_max_secs=100)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == circuit_breaker.CLOSED
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+    # Jittered between half and all of the base backoff
+    assert 20 <= breaker.retry_after() <= 40
+    assert not breaker.allow()
+    assert breaker.skipped == 1
+
+    # Past the backoff: one probe only
+    uasyncio.run(uasyncio.sleep(breaker.retry_after()))
+    assert breaker.allow()
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    assert not breaker.allow()
+
+    # The probe fails, so the backoff doubles (jittered)
+    breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+    assert 40 <= breaker.retry_after() <= 80
+
+    # Capped at the maximum
+    for _ in range(5):
+        uasyncio.run(uasyncio.sleep(breaker.retry_after()))
+        assert breaker.allow()
+        breaker.record_failure()
+    assert 50 <= breaker.retry_after() <= 100
+
+    uasyncio.run(uasyncio.sleep(breaker.retry_after()))
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_abandoned_probe_can_be_retried():
+    breaker = circuit_breaker.CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    uasyncio.run(uasyncio.sleep(breaker.retry_after()))
+    assert breaker.allow()
+    breaker.abandon_probe()
+    assert breaker.allow()
+
+
+def test_cache_skips_failing_source(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    with LocalHTTPServer() as server:
+        # Not served yet, so every fetch is a 404
+        cache = cache_online_data.OnlineDataCache(
+            (data_sources.json_text_source("custom_message", server.url("/gist"), "custom_message"),)
+        )
+
+        for _ in range(5):
+            uasyncio.run(cache.update_source("custom_message"))
+        # Only the first 3 reached the server
+        assert len(server.requests) == 3
+        breaker = cache.breakers["custom_message"]
+        assert breaker.state == circuit_breaker.OPEN
+        assert breaker.skipped == 2
+        assert cache.retry_after("custom_message") > 0
+
+        # Recovered: the probe succeeds and closes the circuit
+        server.set_json("/gist", {"custom_message": "Hello"})
+        uasyncio.run(uasyncio.sleep(cache.retry_after("custom_message")))
+        uasyncio.run(cache.update_source("custom_message"))
+        assert len(server.requests) == 4
+        assert breaker.state == circuit_breaker.CLOSED
+        assert cache.get("custom_message") == "Hello"
+
+
+if __name__ == "__main__":
+    test_opens_after_threshold_and_backs_off()
+    test_abandoned_probe_can_be_retried()
+    test_cache_skips_failing_source(pytest.MonkeyPatch())
+    print("All circuit_breaker tests passed")
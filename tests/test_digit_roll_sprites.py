@@ -0,0 +1,69 @@
+import host_shims
+
+host_shims.install()
+
+import config
+import framebuffer_utils
+import rolling_clock_display_utils
+
+X_POS = config.clock_digits_x[2]
+
+
+def draw_frame(draw):
+    config.picoboard.set_pen(config.PEN_BLACK)
+    config.picoboard.clear()
+    draw()
+    return bytes(framebuffer_utils.get_framebuffer())
+
+
+def test_sprites_match_scroll_digit():
+    rolling_clock_display_utils.build_digit_roll_sprites()
+
+    for reverse in (False, True):
+        for loop_num in range(6):
+            for old_number in range(10):
+                for new_number in range(10):
+                    expected = draw_frame(
+                        lambda: rolling_clock_display_utils.scroll_digit(
+                            {
+                                "reverse": reverse,
+                                "old_number": old_number,
+                                "new_number": new_number,
+                                "x_pos": X_POS,
+                                "y_pos": config.clock_digit_all_y,
+                                "loop_num": loop_num,
+                            }
+                        )
+                    )
+                    actual = draw_frame(
+                        lambda: rolling_clock_display_utils.blit_digit_roll(
+                            old_number, new_number, X_POS, config.clock_digit_all_y, loop_num, reverse
+                        )
+                    )
+                    assert actual == expected, (reverse, loop_num, old_number, new_number)
+
+
+def test_lazy_build_keeps_frame():
+    rolling_clock_display_utils.digit_roll_sprites = None
+
+    def draw():
+        # A digit already drawn in this frame, then a roll that builds the table
+        rolling_clock_display_utils.show_digit(7, config.clock_digits_x[0], config.clock_digit_all_y)
+        rolling_clock_display_utils.blit_digit_roll(1, 2, X_POS, config.clock_digit_all_y, 3, False)
+
+    frame = draw_frame(draw)
+    assert rolling_clock_display_utils.digit_roll_sprites is not None
+    assert frame == draw_frame(draw)
+    # The 7 is still there
+    framebuffer = framebuffer_utils.get_framebuffer()
+    bytes_per_pixel = framebuffer_utils.get_bytes_per_pixel(framebuffer)
+    assert any(
+        framebuffer_utils.read_column_bits(framebuffer, x, bytes_per_pixel)
+        for x in range(config.clock_digits_x[0], config.clock_digits_x[0] + config.char_width)
+    )
+
+
+if __name__ == "__main__":
+    test_sprites_match_scroll_digit()
+    test_lazy_build_keeps_frame()
+    print("All digit roll sprite tests passed")
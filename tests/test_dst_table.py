@@ -0,0 +1,61 @@
+import host_shims
+
+host_shims.install()
+
+import random
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import datetime_utils
+
+LONDON = ZoneInfo("Europe/London")
+
+
+def reference_is_DST(timestamp):
+    return datetime.fromtimestamp(timestamp, LONDON).dst() != timedelta(0)
+
+
+def utc_timestamp(*time_tuple):
+    return int(datetime(*time_tuple, tzinfo=timezone.utc).timestamp())
+
+
+def test_transitions_match_reference_across_decades():
+    # The UK has changed at 01:00 UTC on the last Sundays of March and October since 1996
+    for year in range(1996, 2100):
+        bst_start, bst_end = datetime_utils.bst_transitions(year)
+        assert datetime.fromtimestamp(bst_start, timezone.utc).hour == 1
+        for transition in (bst_start, bst_end):
+            assert reference_is_DST(transition - 1) != reference_is_DST(transition)
+            assert datetime_utils.is_DST(transition - 1) == reference_is_DST(transition - 1)
+            assert datetime_utils.is_DST(transition) == reference_is_DST(transition)
+
+
+def test_random_times_match_reference():
+    randomiser = random.Random(1)
+    start, end = utc_timestamp(1996, 1, 1), utc_timestamp(2100, 1, 1)
+    for _ in range(20000):
+        timestamp = randomiser.randrange(start, end)
+        assert datetime_utils.is_DST(timestamp) == reference_is_DST(timestamp), timestamp
+
+
+def test_table_is_built_once_per_year():
+    datetime_utils.bst_table.clear()
+    for hour in range(0, 365 * 24, 7):
+        datetime_utils.is_DST(utc_timestamp(2031, 1, 1) + hour * 3600)
+    assert list(datetime_utils.bst_table) == [2031]
+
+
+def test_utc_to_local_on_transition_days():
+    # 00:59 UTC is still 00:59 GMT, 01:00 UTC is 02:00 BST
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-03-31T00:59:00Z") == utc_timestamp(2024, 3, 31, 0, 59)
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-03-31T01:00:00Z") == utc_timestamp(2024, 3, 31, 2, 0)
+    # 00:59 UTC is 01:59 BST, 01:00 UTC is back to 01:00 GMT
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-10-27T00:59:00Z") == utc_timestamp(2024, 10, 27, 1, 59)
+    assert datetime_utils.utc_iso_to_local_timestamp("2024-10-27T01:00:00Z") == utc_timestamp(2024, 10, 27, 1, 0)
+
+
+if __name__ == "__main__":
+    test_transitions_match_reference_across_decades()
+    test_random_times_match_reference()
+    test_table_is_built_once_per_year()
+    test_utc_to_local_on_transition_days()
+    print("All DST table tests passed")
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_stream
+
+ARRIVALS = [
+    {
+        "$type": "Tfl.Api.Presentation.Entities.Prediction, Tfl.Api.Presentation.Entities",
+        "id": "-1234",
+        "lineName": "141",
+        "platformName": "S",
+        "timeToStation": 431,
+        "timing": {"countdownServerAdjustment": "00:00:01", "read": "2024-01-01T12:00:00Z"},
+        "destinationName": "London Bridge \"Stn\" é\\",
+    },
+    {"lineName": "341", "timeToStation": 62.5, "modeName": None, "isLive": True},
+    {"timing": {"lineName": "nested"}, "lineName": "141", "timeToStation": 0},
+]
+
+LINE_STATUS = [
+    {
+        "id": "piccadilly",
+        "lineStatuses": [{"statusSeverity": 10, "statusSeverityDescription": "Good Service"}],
+    }
+]
+
+
+def scan(document, keys, chunk_size):
+    items = []
+    scanner = json_stream.JSONKeyScanner(keys, items.append)
+    data = json.dumps(document).encode()
+    for start in range(0, len(data), chunk_size):
+        scanner.feed(data[start : start + chunk_size])
+    scanner.close()
+    return items
+
+
+def test_array_items_at_any_chunk_size():
+    for chunk_size in (1, 2, 3, 7, 64, 4096):
+        items = scan(ARRIVALS, ("lineName", "timeToStation", "destinationName", "isLive", "modeName"), chunk_size)
+        assert items == [
+            {
+                "lineName": "141",
+                "timeToStation": 431,
+                "destinationName": "London Bridge \"Stn\" é\\",
+            },
+            {"lineName": "341", "timeToStation": 62.5, "modeName": None, "isLive": True},
+            # First occurrence at any depth wins
+            {"lineName": "nested", "timeToStation": 0},
+        ], chunk_size
+
+
+def test_nested_key():
+    assert scan(LINE_STATUS, ("id", "statusSeverityDescription"), 5) == [
+        {"id": "piccadilly", "statusSeverityDescription": "Good Service"}
+    ]
+
+
+def test_top_level_object():
+    assert scan({"custom_message": "Next stop: Penmaenmawr"}, ("custom_message",), 4) == [
+        {"custom_message": "Next stop: Penmaenmawr"}
+    ]
+
+
+def test_object_value_is_skipped():
+    assert scan([{"timing": {"a": 1}, "other": 2}], ("timing",), 3) == [{}]
+
+
+def test_surrogate_pairs():
+    # json.dumps escapes the emoji as a surrogate pair, \ud83d\ude00, which must be joined before it's encoded
+    message = "Hello \U0001F600, caf\u00e9"
+    for chunk_size in (1, 3, 7, 64):
+        assert scan({"custom_message": message}, ("custom_message",), chunk_size) == [{"custom_message": message}]
+
+    # Half a pair is replaced
+    for document, expected in (
+        (b'{"m": "a\\ud83dz"}', "a\ufffdz"),
+        (b'{"m": "a\\ud83d\\n"}', "a\ufffd\n"),
+        (b'{"m": "a\\ud83d\\u0041"}', "a\ufffdA"),
+        (b'{"m": "\\ude00\\ud83d"}', "\ufffd\ufffd"),
+    ):
+        items = []
+        scanner = json_stream.JSONKeyScanner(("m",), items.append)
+        scanner.feed(document)
+        assert items == [{"m": expected}]
+
+
+def test_scan_stream():
+    items = []
+    json_stream.scan_stream(io.BytesIO(json.dumps(ARRIVALS).encode()), ("timeToStation",), items.append, chunk_size=10)
+    assert [item["timeToStation"] for item in items] == [431, 62.5, 0]
+
+
+if __name__ == "__main__":
+    test_array_items_at_any_chunk_size()
+    test_nested_key()
+    test_top_level_object()
+    test_object_value_is_skipped()
+    test_surrogate_pairs()
+    test_scan_stream()
+    print("All json_stream tests passed")
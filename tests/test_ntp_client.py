@@ -0,0 +1,120 @@
+import host_shims
+
+host_shims.install()
+
+import socket
+import pytest
+import uasyncio
+import utime  # type: ignore
+import async_http
+import config
+import datetime_utils
+import ntp_client
+import rtc_drift
+from local_ntp_server import LocalNTPServer
+
+
+def run_with_servers(servers, coro_function):
+    async def run():
+        for server in servers:
+            await server.start()
+        try:
+            return await coro_function()
+        finally:
+            for server in servers:
+                server.close()
+
+    return uasyncio.run(run())
+
+
+def test_picks_shortest_round_trip():
+    near = LocalNTPServer(offset_secs=100, delay_ms=40)
+    far = LocalNTPServer(offset_secs=250, delay_ms=600)
+    silent = LocalNTPServer(reply=False)
+    unsynchronised = LocalNTPServer(offset_secs=999, stratum=0)
+    servers = (far, silent, near, unsynchronised)
+
+    start_time = utime.time()
+    response = run_with_servers(
+        servers, lambda: ntp_client.best_response([server.address for server in servers], timeout_ms=1000)
+    )
+
+    assert response.server == near.address
+    # Each poll moves the virtual clock on, so the measured round trip is a little longer than the delay
+    assert 40 <= response.rtt_ms < 200
+    assert all(server.requests == 1 for server in servers)
+
+    # The near server's clock, corrected for half the round trip
+    utc_secs, utc_ms = response.time_now()
+    assert abs(utc_secs + utc_ms / 1000 - (host_shims.clock.now() + 100)) < 0.1
+    # Asked at once: the silent and unsynchronised servers' timeout is the longest wait
+    assert utime.time() - start_time <= 2
+
+
+def test_no_server_answers():
+    silent = LocalNTPServer(reply=False)
+    with pytest.raises(OSError):
+        run_with_servers((silent,), lambda: ntp_client.best_response([silent.address], timeout_ms=200))
+
+
+def test_sync_rtc_sets_local_time(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    monkeypatch.setattr(datetime_utils, "rtc_DST_flag", False)
+    monkeypatch.setattr(datetime_utils, "drift_estimator", rtc_drift.DriftEstimator())
+    datetime_utils.set_rtc(utime.mktime((2024, 1, 1, 12, 0, 0, 0, 0)))
+    # Summer, so the RTC is set to BST
+    server_offset_secs = utime.mktime((2024, 7, 1, 12, 0, 0, 0, 0)) - host_shims.clock.now()
+    server = LocalNTPServer(offset_secs=server_offset_secs)
+
+    async def sync():
+        monkeypatch.setattr(config, "NTP_SERVERS", (server.address,))
+        return await datetime_utils.sync_rtc()
+
+    offset_ms = run_with_servers((server,), sync)
+    # Measured in UTC, so it doesn't include the BST hour
+    assert abs(offset_ms - server_offset_secs * 1000) < 100
+    assert utime.localtime()[:5] == (2024, 7, 1, 13, 0)
+
+
+def test_servers_looked_up_in_quiet_window(monkeypatch):
+    monkeypatch.setattr(async_http, "dns_cache", async_http.DNSCache())
+    drift_estimator = rtc_drift.DriftEstimator()
+    monkeypatch.setattr(datetime_utils, "drift_estimator", drift_estimator)
+    lookups = []
+    getaddrinfo = socket.getaddrinfo
+
+    def counting_getaddrinfo(host, *args):
+        lookups.append(host)
+        return getaddrinfo(host, *args)
+
+    monkeypatch.setattr(socket, "getaddrinfo", counting_getaddrinfo)
+    server = LocalNTPServer()
+
+    async def sync():
+        monkeypatch.setattr(config, "NTP_SERVERS", (server.address,))
+        # Too far off for a lookup to last until the sync
+        drift_estimator.next_sync_time = utime.time() + config.DNS_CACHE_TTL_SECS + 60
+        datetime_utils.resolve_ntp_servers_if_due()
+        assert lookups == []
+
+        # Looked up in the first quiet window that's close enough, and not again in later ones
+        await uasyncio.sleep(120)
+        datetime_utils.resolve_ntp_servers_if_due()
+        await uasyncio.sleep(200)
+        datetime_utils.resolve_ntp_servers_if_due()
+        assert lookups == ["127.0.0.1"]
+        await uasyncio.sleep(drift_estimator.next_sync_time - utime.time())
+
+        # The sync finds the address in the cache
+        return await ntp_client.best_response()
+
+    assert run_with_servers((server,), sync).server == server.address
+    assert lookups == ["127.0.0.1"]
+
+
+if __name__ == "__main__":
+    test_picks_shortest_round_trip()
+    test_no_server_answers()
+    test_sync_rtc_sets_local_time(pytest.MonkeyPatch())
+    test_servers_looked_up_in_quiet_window(pytest.MonkeyPatch())
+    print("All NTP client tests passed")
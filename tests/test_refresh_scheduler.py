@@ -0,0 +1,104 @@
+import host_shims
+
+host_shims.install()
+
+import pytest
+import uasyncio
+import utime  # type: ignore
+import config
+import refresh_scheduler
+
+
+class FakeCache:
+    # Just enough of OnlineDataCache for the scheduler. Each update succeeds unless the item is in failing.
+    def __init__(self, expiries):
+        self.cache_expiry = dict(expiries)
+        self.failing = set()
+        self.refreshed = []
+        self.circuit_retry_secs = {}
+        self.updaters = {cache_item: self.make_updater(cache_item) for cache_item in expiries}
+
+    def make_updater(self, cache_item):
+        async def update():
+            self.refreshed.append(cache_item)
+            if cache_item not in self.failing:
+                self.cache_expiry[cache_item] = utime.time() + 600
+
+        return update
+
+    def save_snapshot(self):
+        pass
+
+    def retry_after(self, cache_item):
+        return self.circuit_retry_secs.get(cache_item, 0)
+
+
+def test_most_urgent_first_within_lookahead():
+    now = utime.time()
+    cache = FakeCache(
+        {
+            "custom_message": now + 3600,
+            "piccadilly_line_status": now + 20,
+            "next_buses": now - 5,
+        }
+    )
+    scheduler = refresh_scheduler.RefreshScheduler(cache)
+
+    uasyncio.run(scheduler.run_quiet_window())
+    # Overdue bus data first, then the line status which expires before the next window. Not the custom message.
+    assert cache.refreshed == ["next_buses", "piccadilly_line_status"]
+    assert scheduler.stats["next_buses"] == [0, 1, 0]
+    assert scheduler.stats["piccadilly_line_status"] == [1, 0, 0]
+
+    cache.refreshed = []
+    uasyncio.run(scheduler.run_quiet_window())
+    assert cache.refreshed == []
+
+
+def test_failed_refresh_retries_later():
+    cache = FakeCache({"next_buses": None})
+    cache.failing.add("next_buses")
+    scheduler = refresh_scheduler.RefreshScheduler(cache)
+
+    uasyncio.run(scheduler.run_quiet_window())
+    assert scheduler.stats["next_buses"] == [0, 0, 1]
+    assert scheduler.queue[0][0] >= utime.time() + config.REFRESH_RETRY_SECS - 1
+
+
+def test_failed_refresh_does_not_hold_up_others(monkeypatch):
+    now = utime.time()
+    cache = FakeCache({"next_buses": now - 5, "piccadilly_line_status": now + 40})
+    cache.failing.add("next_buses")
+    scheduler = refresh_scheduler.RefreshScheduler(cache)
+
+    # The retry falls after the lookahead, so the failed item isn't due again in this window
+    assert config.REFRESH_RETRY_SECS > config.REFRESH_LOOKAHEAD_SECS
+    uasyncio.run(scheduler.run_quiet_window())
+    assert cache.refreshed == ["next_buses", "piccadilly_line_status"]
+
+    # Even a failed item that falls due again at once is skipped, not the end of the window
+    monkeypatch.setattr(config, "REFRESH_RETRY_SECS", 10)
+    cache = FakeCache({"next_buses": now - 5, "piccadilly_line_status": now + 40})
+    cache.failing.add("next_buses")
+    scheduler = refresh_scheduler.RefreshScheduler(cache)
+    uasyncio.run(scheduler.run_quiet_window())
+    assert cache.refreshed == ["next_buses", "piccadilly_line_status"]
+    assert [cache_item for _, cache_item in scheduler.queue].count("next_buses") == 1
+
+
+def test_failed_refresh_waits_for_open_circuit():
+    cache = FakeCache({"next_buses": None})
+    cache.failing.add("next_buses")
+    cache.circuit_retry_secs["next_buses"] = 300
+    scheduler = refresh_scheduler.RefreshScheduler(cache)
+
+    uasyncio.run(scheduler.run_quiet_window())
+    assert scheduler.queue[0][0] >= utime.time() + 300 - 1
+
+
+if __name__ == "__main__":
+    test_most_urgent_first_within_lookahead()
+    test_failed_refresh_retries_later()
+    test_failed_refresh_does_not_hold_up_others(pytest.MonkeyPatch())
+    test_failed_refresh_waits_for_open_circuit()
+    print("All refresh_scheduler tests passed")
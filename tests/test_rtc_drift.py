@@ -0,0 +1,134 @@
+import host_shims
+
+host_shims.install()
+
+import pytest
+import uasyncio
+import utime  # type: ignore
+import config
+import datetime_utils
+import rtc_drift
+from local_ntp_server import LocalNTPServer
+
+
+def make_estimator():
+    return rtc_drift.DriftEstimator(
+        max_error_ms=1000, min_interval_secs=900, max_interval_secs=86400, initial_interval_secs=3600, smoothing=0.5
+    )
+
+
+def test_estimates_drift_from_offsets():
+    estimator = make_estimator()
+    assert estimator.record_sync(0, 0) == 3600
+    assert estimator.drift_ppm is None
+
+    # The RTC gained 0.72s in 2 hours: 100 ppm
+    assert estimator.record_sync(-720, 7200) == 3600
+    assert estimator.drift_ppm == 100
+    assert estimator.next_sync_time == 10800
+
+    # The next measurement is smoothed into the estimate
+    estimator.record_sync(-1080, 10800)
+    assert estimator.drift_ppm == 200
+    # Over the error bound, so sync more often
+    assert estimator.interval_secs == 1800
+
+
+def test_steps_follow_drift_and_interval_stretches():
+    estimator = make_estimator()
+    estimator.record_sync(0, 0)
+    estimator.record_sync(-720, 7200)
+
+    # Half a second out after 5000s at 100 ppm, then a second further each 10000s, up to the next sync
+    estimator.interval_secs = 20000
+    estimator.record_sync(-300, 10800)
+    assert estimator.interval_secs == 40000
+    assert estimator.next_step_time() == 10800 + int(500 * 1000 / estimator.drift_ppm)
+    assert estimator.step() == -1
+    assert estimator.next_step_time() == 10800 + int(1500 * 1000 / estimator.drift_ppm)
+    assert estimator.next_sync_time == 10800 + 40000 - 1
+
+    # Steps that kept up mean the drift estimate holds, and the clock stayed well in bounds
+    drift_ppm = estimator.drift_ppm
+    estimator.step()
+    estimator.step()
+    estimator.step()
+    estimator.record_sync(-1000 * 40000 * drift_ppm / 1000000 + 4000, 10800 + 40000)
+    assert abs(estimator.drift_ppm - drift_ppm) < 0.01
+    assert estimator.interval_secs == 80000
+
+
+def test_sync_task_steps_rtc_between_syncs(monkeypatch):
+    estimator = make_estimator()
+    monkeypatch.setattr(datetime_utils, "drift_estimator", estimator)
+    monkeypatch.setattr(datetime_utils, "rtc_DST_flag", False)
+    datetime_utils.set_rtc(utime.mktime((2024, 1, 15, 12, 0, 0, 0, 0)))
+    now = utime.time()
+    estimator.record_sync(0, now - 7200)
+    # A clock losing 500 ppm is half a second behind after 1000s, then a second further each 2000s
+    estimator.record_sync(3600, now)
+    assert estimator.drift_ppm == -500
+    estimator.next_sync_time = now + 4000
+
+    rtc_start = utime.time()
+    slept_start = host_shims.clock.slept
+    uasyncio.run(datetime_utils.wait_for_next_sync())
+
+    # Stepped forward at 1000s and 3000s, so the RTC (the virtual clock here) has moved 2s more than the sleeps
+    assert estimator.corrected_ms == 2000
+    assert round((utime.time() - rtc_start) - (host_shims.clock.slept - slept_start)) == 2
+    assert utime.time() >= estimator.next_sync_time
+
+
+def test_sync_across_BST_start_is_not_drift(monkeypatch):
+    host_shims.connect_wifi(monkeypatch)
+    estimator = make_estimator()
+    monkeypatch.setattr(datetime_utils, "drift_estimator", estimator)
+    monkeypatch.setattr(datetime_utils, "rtc_DST_flag", None)
+    # The server's clock is the virtual clock, which is UTC until the RTC is set to BST
+    server = LocalNTPServer()
+    datetime_utils.set_rtc(utime.mktime((2024, 3, 31, 0, 0, 0, 0, 0)))
+
+    async def sync_twice():
+        await server.start()
+        try:
+            monkeypatch.setattr(config, "NTP_SERVERS", (server.address,))
+            first_offset_ms = await datetime_utils.sync_rtc()
+            # BST starts at 01:00 UTC while the RTC is left alone
+            await uasyncio.sleep(2 * 3600)
+            return first_offset_ms, await datetime_utils.sync_rtc()
+        finally:
+            server.close()
+
+    first_offset_ms, second_offset_ms = uasyncio.run(sync_twice())
+    assert abs(first_offset_ms) < 100
+    assert abs(second_offset_ms) < 100
+    assert abs(estimator.drift_ppm) < 20
+    assert datetime_utils.rtc_DST_flag
+    assert utime.localtime()[3] == 3
+
+
+def test_rtc_changes_to_BST_between_syncs(monkeypatch):
+    estimator = make_estimator()
+    monkeypatch.setattr(datetime_utils, "drift_estimator", estimator)
+    monkeypatch.setattr(datetime_utils, "rtc_DST_flag", False)
+    start_time = utime.mktime((2024, 3, 31, 0, 30, 0, 0, 0))
+    datetime_utils.set_rtc(start_time)
+    estimator.record_sync(0, start_time)
+
+    slept_start = host_shims.clock.slept
+    uasyncio.run(datetime_utils.wait_for_next_sync())
+
+    # Forward an hour at 01:00 GMT, and the sync still an hour after the last on the real clock
+    assert datetime_utils.rtc_DST_flag
+    assert round(host_shims.clock.slept - slept_start) == 3600
+    assert utime.localtime()[3:5] == (2, 30)
+
+
+if __name__ == "__main__":
+    test_estimates_drift_from_offsets()
+    test_steps_follow_drift_and_interval_stretches()
+    test_sync_task_steps_rtc_between_syncs(pytest.MonkeyPatch())
+    test_sync_across_BST_start_is_not_drift(pytest.MonkeyPatch())
+    test_rtc_changes_to_BST_between_syncs(pytest.MonkeyPatch())
+    print("All RTC drift tests passed")
@@ -0,0 +1,41 @@
+import host_shims
+
+host_shims.install()
+
+import uasyncio
+import utils
+import task_profiler
+
+
+def run_task(profiler, task_name, duration_secs, pushed, skipped):
+    profiler.start_task()
+    uasyncio.run(uasyncio.sleep(duration_secs))
+    utils.display_update_stats["pushed"] += pushed
+    utils.display_update_stats["skipped"] += skipped
+    profiler.end_task(task_name, timed_out=False)
+
+
+def test_counts_skipped_frames_and_resets_after_report():
+    profiler = task_profiler.TaskProfiler(max_tasks=4)
+    run_task(profiler, "clock", 2, pushed=10, skipped=30)
+    run_task(profiler, "clock", 4, pushed=5, skipped=0)
+
+    row = profiler.table["clock"]
+    assert row[task_profiler.RUNS] == 2
+    assert 2000 <= row[task_profiler.MIN_MS] < 2100
+    assert 4000 <= row[task_profiler.MAX_MS] < 4100
+    # A frame that matched the last one still counts as drawn
+    assert row[task_profiler.FRAMES] == 45
+
+    profiler.print_report()
+    assert row[task_profiler.RUNS] == 0
+
+    # The next report doesn't carry the slow run over
+    run_task(profiler, "clock", 1, pushed=3, skipped=0)
+    assert 1000 <= row[task_profiler.MIN_MS] == row[task_profiler.MAX_MS] < 1100
+    assert row[task_profiler.FRAMES] == 3
+
+
+if __name__ == "__main__":
+    test_counts_skipped_frames_and_resets_after_report()
+    print("All task_profiler tests passed")
@@ -0,0 +1,68 @@
+"""
+Author: Adam Knowles
+Version: 0.1
+Name: text_layout_cache.py
+Description: A bounded LRU cache of text layouts (widths, line splits and x positions), so repeated messages skip measuring
+
+GitHub Repository: https://github.com/Pharkie/AdamGalactic/
+License: GNU General Public License (GPL)
+"""
+from collections import OrderedDict
+import config
+
+
+# Class to represent the text layout cache object
+class TextLayoutCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # Least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Return (text_width, lines) for the text, where lines is a tuple of (line_text, x_pos, y_pos)
+    # laid out as show_static_message() displays it: centred, split over two lines if too wide
+    def get_layout(self, text, scale=1):
+        key = (text, config.FONT, scale)
+        layout = self.entries.get(key)
+
+        if layout is not None:
+            self.hits += 1
+            # Move to the most recently used end
+            del self.entries[key]
+            self.entries[key] = layout
+            return layout
+
+        self.misses += 1
+        layout = self.compute_layout(text, scale)
+
+        if len(self.entries) >= self.max_entries:
+            # Evict the least recently used layout
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = layout
+
+        return layout
+
+    def compute_layout(self, text, scale):
+        text_width = config.picoboard.measure_text(text, scale)
+
+        if text_width > config.DISPLAY_WIDTH:
+            # Find the index of the first space from the centre of the message
+            space_index = text.find(" ", len(text) // 2)
+
+            if space_index != -1:
+                line1 = text[:space_index]
+                line2 = text[space_index + 1 :]
+                x_pos1 = (config.DISPLAY_WIDTH - config.picoboard.measure_text(line1, scale)) // 2
+                x_pos2 = (config.DISPLAY_WIDTH - config.picoboard.measure_text(line2, scale)) // 2
+                return text_width, ((line1, x_pos1, -1), (line2, x_pos2, 5))
+
+        x_pos = (config.DISPLAY_WIDTH - text_width) // 2
+        return text_width, ((text, x_pos, 2),)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -8,97 +8,139 @@ GitHub Repository: https://github.com/Pharkie/AdamGalactic/
 License: GNU General Public License (GPL)
 """
 
+import binascii
 import config
+import framebuffer_utils
+import frame_pacing
+import text_layout_cache
 import network  # type: ignore
 import utime  # type: ignore
 
 import uasyncio
 
+# Shared by all the scrolling tickers, so its late and dropped frame counters cover every scroll
+scroll_scheduler = frame_pacing.FrameScheduler(config.SCROLL_FPS)
 
-def clear_picoboard():
+# Shared by show_static_message() and scroll_msg(), as the same strings repeat all day
+layout_cache = text_layout_cache.TextLayoutCache(config.LAYOUT_CACHE_SIZE)
+
+# What update_display() last pushed to the panel, and how many pushes it avoided
+last_pushed_frame_crc = None
+last_pushed_brightness = None
+display_update_stats = {"pushed": 0, "skipped": 0}
+
+
+def update_display(force=False):
+    # Push the framebuffer to the panel, unless it matches the last frame pushed at the same brightness.
+    # Returns True if the frame was pushed.
+    global last_pushed_frame_crc, last_pushed_brightness
+
+    frame_crc = binascii.crc32(framebuffer_utils.get_framebuffer())
+    brightness = config.gu.get_brightness()
+
+    if (
+        not force
+        and frame_crc == last_pushed_frame_crc
+        and brightness == last_pushed_brightness
+    ):
+        display_update_stats["skipped"] += 1
+        return False
+
+    config.gu.update(config.picoboard)
+    last_pushed_frame_crc = frame_crc
+    last_pushed_brightness = brightness
+    display_update_stats["pushed"] += 1
+    return True
+
+
+def clear_picoboard(update=True):
     config.picoboard.set_pen(config.PEN_BLACK)
     config.picoboard.clear()
-    config.gu.update(config.picoboard)
+    if update:
+        update_display()
 
 
 def show_static_message(message, pen_colour, brightness=1.0):
     # print(f"show_static_message() called with message: {message}, pen_colour: {pen_colour}, brightness: {brightness}")
 
     previous_brightness = config.gu.get_brightness()
-    clear_picoboard()
+    # No need to push the blank frame, the message is pushed below
+    clear_picoboard(update=False)
 
     config.picoboard.set_pen(config.PEN_GREY)
 
-    # Calculate the X position to center the text horizontally
-    text_width = config.picoboard.measure_text(message, 1)
-    x_pos = (config.DISPLAY_WIDTH - text_width) // 2
-
-    # Split the message into two lines if the text width is greater than display width
-    if text_width > config.DISPLAY_WIDTH:
-        # Find the index of the space closest to the center of the message
-        space_index = len(message) // 2
-        while message[space_index] != " ":
-            space_index += 1
-
-        # Split the message into two lines at the space index
-        line1 = message[:space_index]
-        line2 = message[space_index + 1 :]
-
-        # Calculate the X position to center each line horizontally
-        text_width1 = config.picoboard.measure_text(line1, 1)
-        x_pos1 = (config.DISPLAY_WIDTH - text_width1) // 2
-        text_width2 = config.picoboard.measure_text(line2, 1)
-        x_pos2 = (config.DISPLAY_WIDTH - text_width2) // 2
-
-        # Display each line of the message on a separate line
-        config.picoboard.text(
-            text=line1, x1=x_pos1, y1=-1, wordwrap=-1, scale=1
-        )
-        config.picoboard.text(text=line2, x1=x_pos2, y1=5, wordwrap=-1, scale=1)
-    else:
-        # Display the message on a single line
+    # Centred, and split over two lines if wider than the display
+    _, lines = layout_cache.get_layout(message, 1)
+    for line_text, x_pos, y_pos in lines:
         config.picoboard.text(
-            text=message, x1=x_pos, y1=2, wordwrap=-1, scale=1
+            text=line_text, x1=x_pos, y1=y_pos, wordwrap=-1, scale=1
         )
 
     config.gu.set_brightness(brightness)
-    config.gu.update(config.picoboard)
+    update_display()
     config.gu.set_brightness(previous_brightness)
 
 
-async def scroll_msg(msg_text):
+async def scroll_msg(msg_text, prepared=None):
     # print(f"scroll_msg() called with msg_text: {msg_text}")
+    # prepared: optional cache display entry for msg_text (see OnlineDataCache.get_display()), which keeps the
+    # rendered strip and width so the message is only rendered and measured again when its text changes
+
+    # Only the width is needed to scroll, so the text is measured directly rather than laid out in the layout cache,
+    # which keeps its entries for the static messages
+    length = prepared.width if prepared is not None else None
+    if length is None:
+        length = config.picoboard.measure_text(msg_text, 1)
+        if prepared is not None:
+            prepared.width = length
+
+    if config.SCROLL_WITH_STRIP:
+        strip = prepared.strip if prepared is not None else None
+        if strip is None:
+            # Render the message once, then only copy the visible window each frame
+            strip = framebuffer_utils.render_scroll_strip(
+                msg_text, y_pos=2, strip_width=length
+            )
+            if prepared is not None:
+                prepared.strip = strip
+
+    scroll_scheduler.start()
+
+    # Scroll from just off the right edge until the message has left the left edge
+    p = config.DISPLAY_WIDTH
+    while p > -length:
+        if config.SCROLL_WITH_STRIP:
+            framebuffer_utils.draw_scroll_strip(strip, p, config.PEN_YELLOW)
+        else:
+            config.picoboard.set_pen(config.PEN_BLACK)
+            config.picoboard.clear()
+            config.picoboard.set_pen(config.PEN_YELLOW)
+            config.picoboard.text(
+                text=msg_text, x1=p, y1=2, wordwrap=-1, scale=1
+            )
+        update_display()
+        # Skips extra pixels if we fell behind, to keep a constant visual speed
+        p -= await scroll_scheduler.wait_next_frame()
 
-    length = config.picoboard.measure_text(msg_text, 1)
-    steps = (
-        length + config.DISPLAY_WIDTH
-    )  # Scroll the msg_text with a bit of padding, min 53
+    # print(f"scroll_msg() complete. Frame stats: {scroll_scheduler.stats()}")
 
-    p = config.DISPLAY_WIDTH
-    for _ in range(steps):
-        config.picoboard.set_pen(config.PEN_BLACK)
-        config.picoboard.clear()
-        config.picoboard.set_pen(config.PEN_YELLOW)
-        config.picoboard.text(text=msg_text, x1=p, y1=2, wordwrap=-1, scale=1)
-        config.gu.update(config.picoboard)
-        p -= 1
-        await uasyncio.sleep(0.03)
 
-    # print("scroll_msg() complete")
+# Cache items shown by scroll_configured_message()
+CUSTOM_MESSAGE_ITEMS = ("custom_message",)
 
 
 async def scroll_configured_message():
-    # Retrieve the msg from the cache
-    msg = config.my_cache.get("custom_message")
+    # Retrieve the msg text the cache has prepared
+    display = config.my_cache.get_display(CUSTOM_MESSAGE_ITEMS)
     # print(f"scroll_configured_message()")
 
     # Get custom message from cache, if available
     try:
         # Check if msg is None (i.e. expired)
-        if msg is None:
+        if display.text is None:
             raise Exception("Error: msg is expired or missing")
 
-        await scroll_msg(msg)
+        await scroll_msg(display.text, display)
 
     except Exception as e:
         print(f"Error: {e}")